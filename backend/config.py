@@ -1,4 +1,5 @@
 import logging
+import os
 import yaml
 from pathlib import Path
 
@@ -11,6 +12,11 @@ class Config:
     PORT = 12398
     CORS_ORIGINS = ['http://localhost:5173', 'http://localhost:3000']
     OUTPUT_DIR = 'output'
+    # 部署在支持 X-Sendfile 头的前端服务器之后时可开启（Apache + mod_xsendfile、lighttpd）：
+    # send_file 只返回 X-Sendfile 头，由前端服务器以零拷贝方式（sendfile）直接发送图片文件，
+    # 不再经过 Python 读写。nginx 不识别 X-Sendfile（它使用 X-Accel-Redirect），
+    # 在 nginx 之后开启会返回空的响应体，请勿开启
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
 
     _image_providers_config = None
     _text_providers_config = None
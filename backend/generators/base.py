@@ -1,6 +1,12 @@
 """图片生成器抽象基类"""
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
+from ..utils.http_session import create_http_session
+
+
+# 所有基于 requests 的生成器共享的 HTTP 会话
+# 并发生成的各页面复用同一个连接池（keep-alive），避免每次请求重新建立 TCP/TLS 连接
+http_session = create_http_session()
 
 
 class ImageGeneratorBase(ABC):
@@ -3,7 +3,7 @@ import logging
 import base64
 import requests
 from typing import Dict, Any, Optional, List, Union
-from .base import ImageGeneratorBase
+from .base import ImageGeneratorBase, http_session
 from ..utils.image_compressor import compress_image
 
 logger = logging.getLogger(__name__)
@@ -152,7 +152,7 @@ class ImageApiGenerator(ImageGeneratorBase):
 
         api_url = f"{self.base_url}{self.endpoint_type}"
         logger.debug(f"  发送请求到: {api_url}")
-        response = requests.post(api_url, headers=headers, json=payload, timeout=300)
+        response = http_session.post(api_url, headers=headers, json=payload, timeout=300)
 
         if response.status_code != 200:
             error_detail = response.text[:500]
@@ -248,7 +248,7 @@ class ImageApiGenerator(ImageGeneratorBase):
         api_url = f"{self.base_url}{self.endpoint_type}"
         logger.info(f"Chat API 生成图片: {api_url}, model={model}")
 
-        response = requests.post(api_url, headers=headers, json=payload, timeout=300)
+        response = http_session.post(api_url, headers=headers, json=payload, timeout=300)
 
         if response.status_code != 200:
             error_detail = response.text[:500]
@@ -330,7 +330,7 @@ class ImageApiGenerator(ImageGeneratorBase):
         """下载图片并返回二进制数据"""
         logger.info(f"下载图片: {url[:100]}...")
         try:
-            response = requests.get(url, timeout=60)
+            response = http_session.get(url, timeout=60)
             if response.status_code == 200:
                 logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
                 return response.content
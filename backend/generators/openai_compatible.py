@@ -3,7 +3,7 @@ import logging
 import base64
 from typing import Dict, Any
 import requests
-from .base import ImageGeneratorBase
+from .base import ImageGeneratorBase, http_session
 
 logger = logging.getLogger(__name__)
 
@@ -124,7 +124,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
             files["model"] = (None, model)
 
         try:
-            response = requests.post(url, headers=headers, files=files, timeout=300)
+            response = http_session.post(url, headers=headers, files=files, timeout=300)
             
             if response.status_code != 200:
                 error_detail = response.text[:500]
@@ -177,7 +177,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         if quality and model.startswith('dall-e'):
             payload["quality"] = quality
 
-        response = requests.post(url, headers=headers, json=payload, timeout=300)
+        response = http_session.post(url, headers=headers, json=payload, timeout=300)
 
         if response.status_code != 200:
             error_detail = response.text[:500]
@@ -222,7 +222,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         # 处理URL格式
         elif "url" in image_data:
             logger.debug(f"  下载图片 URL...")
-            img_response = requests.get(image_data["url"], timeout=60)
+            img_response = http_session.get(image_data["url"], timeout=60)
             if img_response.status_code == 200:
                 logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_response.content)} bytes")
                 return img_response.content
@@ -277,14 +277,14 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
             "temperature": 1.0
         }
 
-        response = requests.post(url, headers=headers, json=payload, timeout=300)
+        response = http_session.post(url, headers=headers, json=payload, timeout=300)
 
         # 处理 max_tokens 参数错误 (部分新模型如 o1/o3 要求使用 max_completion_tokens)
         if response.status_code == 400 and "max_token" in response.text:
             logger.warning(f"模型 {model} 不支持 max_tokens 参数，尝试使用 max_completion_tokens 重试...")
             if "max_tokens" in payload:
                 payload["max_completion_tokens"] = payload.pop("max_tokens")
-                response = requests.post(url, headers=headers, json=payload, timeout=300)
+                response = http_session.post(url, headers=headers, json=payload, timeout=300)
 
         if response.status_code != 200:
             error_detail = response.text[:500]
@@ -371,7 +371,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         """下载图片并返回二进制数据"""
         logger.info(f"下载图片: {url[:100]}...")
         try:
-            response = requests.get(url, timeout=60)
+            response = http_session.get(url, timeout=60)
             if response.status_code == 200:
                 logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
                 return response.content
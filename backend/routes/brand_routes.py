@@ -478,8 +478,11 @@ def create_brand_blueprint():
             # 导入风格提取服务
             from backend.services.style_extractor import get_style_extractor_service
 
+            # 用户重试时跳过缓存的分析结果
+            data = request.get_json(silent=True) or {}
+
             extractor = get_style_extractor_service()
-            result = extractor.extract_style(brand_id)
+            result = extractor.extract_style(brand_id, refresh=bool(data.get('refresh')))
 
             return jsonify(result)
         except Exception as e:
@@ -237,6 +237,18 @@ def _clear_config_cache():
     except Exception:
         pass
 
+    try:
+        from backend.utils import file_cache
+        file_cache.invalidate()
+    except Exception:
+        pass
+
+    try:
+        from backend.services.outline import invalidate_outline_service
+        invalidate_outline_service()
+    except Exception:
+        pass
+
 
 def _load_provider_config(provider_type: str, provider_name: str, config: dict) -> dict:
     """
@@ -14,7 +14,7 @@ import json
 import base64
 import logging
 from flask import Blueprint, request, jsonify, Response, send_file
-from backend.services.image import get_image_service
+from backend.services.image import get_image_service, get_thumbnail, resolve_image_path
 from .utils import log_request, log_error
 
 logger = logging.getLogger(__name__)
@@ -123,25 +123,26 @@ def create_image_blueprint():
         try:
             logger.debug(f"获取图片: {task_id}/{filename}")
 
+            # 只允许读取历史记录目录下的图片文件（拒绝 ".." 等路径穿越）
+            image_path = resolve_image_path(task_id, filename)
+            if image_path is None:
+                return jsonify({
+                    "success": False,
+                    "error": f"图片不存在：{task_id}/{filename}"
+                }), 404
+
             # 检查是否请求缩略图
             thumbnail = request.args.get('thumbnail', 'true').lower() == 'true'
 
-            # 构建 history 目录路径
-            history_root = os.path.join(
-                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-                "history"
-            )
-
-            if thumbnail:
-                # 尝试返回缩略图
-                thumb_filename = f"thumb_{filename}"
-                thumb_filepath = os.path.join(history_root, task_id, thumb_filename)
+            if thumbnail and not filename.startswith('thumb_'):
+                # 尝试返回缩略图（首次请求时生成）
+                thumb_filepath = get_thumbnail(task_id, filename)
 
-                if os.path.exists(thumb_filepath):
+                if thumb_filepath:
                     return send_file(thumb_filepath, mimetype='image/png')
 
             # 返回原图
-            filepath = os.path.join(history_root, task_id, filename)
+            filepath = str(image_path)
 
             if not os.path.exists(filepath):
                 return jsonify({
@@ -502,8 +503,16 @@ def create_image_blueprint():
 
             # 不返回封面图片数据（太大）
             safe_state = {
-                "generated": state.get("generated", {}),
-                "failed": state.get("failed", {}),
+                "generated": {
+                    index: page.filename
+                    for index, page in state["page_states"].items()
+                    if page.status == "done"
+                },
+                "failed": {
+                    index: page.error
+                    for index, page in state["page_states"].items()
+                    if page.status == "error"
+                },
                 "has_cover": state.get("cover_image") is not None
             }
 
@@ -11,6 +11,7 @@ import re
 import yaml
 from pathlib import Path
 from typing import Dict, List, Any, Optional
+from backend.utils.file_cache import load_yaml
 from backend.utils.text_client import get_text_chat_client
 
 logger = logging.getLogger(__name__)
@@ -31,19 +32,19 @@ class ContentService:
         config_path = Path(__file__).parent.parent.parent / 'text_providers.yaml'
         logger.debug(f"加载文本配置: {config_path}")
 
-        if config_path.exists():
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f) or {}
-                logger.debug(f"文本配置加载成功: active={config.get('active_provider')}")
-                return config
-            except yaml.YAMLError as e:
-                logger.error(f"文本配置 YAML 解析失败: {e}")
-                raise ValueError(
-                    f"文本配置文件格式错误: text_providers.yaml\n"
-                    f"YAML 解析错误: {e}\n"
-                    "解决方案：检查 YAML 缩进和语法"
-                )
+        try:
+            config = load_yaml(config_path) or {}
+            logger.debug(f"文本配置加载成功: active={config.get('active_provider')}")
+            return config
+        except FileNotFoundError:
+            pass
+        except yaml.YAMLError as e:
+            logger.error(f"文本配置 YAML 解析失败: {e}")
+            raise ValueError(
+                f"文本配置文件格式错误: text_providers.yaml\n"
+                f"YAML 解析错误: {e}\n"
+                "解决方案：检查 YAML 缩进和语法"
+            )
 
         logger.warning("text_providers.yaml 不存在，使用默认配置")
         return {
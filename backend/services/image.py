@@ -1,12 +1,19 @@
 """图片生成服务"""
 import logging
 import os
+import queue
 import uuid
 import time
 import base64
+import functools
+import string
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, Any, Generator, List, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Callable, Generator, List, Optional, Tuple, Union
+from PIL import Image
 from backend.config import Config
 from backend.generators.factory import ImageGeneratorFactory
 from backend.utils.image_compressor import compress_image
@@ -14,6 +21,14 @@ from backend.utils.image_compressor import compress_image
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True)
+class _PageState:
+    """单页生成状态"""
+    status: str = "pending"  # pending / done / error
+    filename: Optional[str] = None
+    error: Optional[str] = None
+
+
 def _get_active_brand_style() -> Optional[str]:
     """获取当前激活品牌的风格Prompt"""
     try:
@@ -25,12 +40,251 @@ def _get_active_brand_style() -> Optional[str]:
         return None
 
 
+# Prompt 模板目录
+_PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
+
+
+@functools.lru_cache(maxsize=4)
+def _read_template(path: str, mtime_ns: int) -> str:
+    """读取 Prompt 模板（按路径和修改时间缓存，模板文件被修改后自动重新读取）"""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_template(template: str, prefix: str = "") -> Callable[[Dict[str, Any]], str]:
+    """
+    预编译 Prompt 模板
+
+    模板只在编译时解析一次，之后每页只需按字段拼接字符串，
+    不再让 str.format 逐字符扫描整个模板。
+    包含格式说明符、转换符或属性/下标访问的模板回退为 str.format。
+
+    Args:
+        template: Prompt 模板
+        prefix: 固定前缀（如品牌风格），原样拼接在模板之前，不参与格式化
+
+    Returns:
+        接收字段字典、返回填充后 Prompt 的函数
+    """
+    try:
+        parsed = list(string.Formatter().parse(template))
+    except ValueError:
+        # 花括号不匹配，保持 str.format 的行为（调用时抛出异常）
+        return lambda fields: prefix + template.format(**fields)
+
+    segments = []
+    for literal, field_name, format_spec, conversion in parsed:
+        if field_name is not None and (
+            format_spec or conversion or not field_name.isidentifier()
+        ):
+            return lambda fields: prefix + template.format(**fields)
+        segments.append((literal, field_name))
+
+    # 前缀并入第一段字面量，每页不再额外拼接
+    if segments:
+        segments[0] = (prefix + segments[0][0], segments[0][1])
+    else:
+        segments.append((prefix, None))
+
+    def render(fields: Dict[str, Any]) -> str:
+        parts = []
+        for literal, field_name in segments:
+            parts.append(literal)
+            if field_name is not None:
+                parts.append(str(fields[field_name]))
+        return "".join(parts)
+
+    return render
+
+
+# 历史记录根目录
+_HISTORY_ROOT = Path(__file__).resolve().parents[2] / "history"
+
+# 图片压缩线程池：压缩是 CPU 密集型任务，线程数按 CPU 核数限制，
+# 与负责等待服务商 HTTP 响应的生成线程池分开
+_compress_executor = ThreadPoolExecutor(
+    max_workers=min(8, os.cpu_count() or 1),
+    thread_name_prefix="imgsvc-cpu"
+)
+
+# 缩略图生成锁（每个缩略图文件一把，避免并发请求重复生成）
+# 缩略图路径 -> [锁, 正在使用该锁的请求数]，使用数归零后才移除
+_thumbnail_locks: Dict[str, List[Any]] = {}
+_thumbnail_locks_guard = threading.Lock()
+
+
+def _write_fd(fd: int, data: bytes) -> None:
+    """
+    通过原始文件描述符写入全部数据并关闭
+
+    图片是一整块连续的字节，跳过 Python 的缓冲写入层可以少一次内存拷贝。
+    """
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+
+def _raw_write(path: Union[str, Path], data: bytes) -> None:
+    """以覆盖方式写入文件（不经过 Python 缓冲层）"""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    _write_fd(os.open(path, flags, 0o644), data)
+
+
+def _write_thumbnail(image_data: bytes, thumbnail_path: str) -> bool:
+    """
+    生成并写入缩略图
+
+    先写临时文件再原子替换，避免图片接口读到写了一半的缩略图。
+
+    Returns:
+        是否写入成功
+    """
+    tmp_path = f"{thumbnail_path}.tmp"
+    try:
+        # 50KB 的缩略图看不出 LANCZOS 的画质优势，使用更快的 BILINEAR
+        thumbnail_data = compress_image(
+            image_data, max_size_kb=50, resample=Image.Resampling.BILINEAR
+        )
+        _raw_write(tmp_path, thumbnail_data)
+        os.replace(tmp_path, thumbnail_path)
+        return True
+    except Exception as e:
+        logger.warning(f"缩略图生成失败: {thumbnail_path}, {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+# 可以通过图片接口读取和生成缩略图的文件类型
+_IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".webp"})
+
+
+def resolve_image_path(task_id: str, filename: str) -> Optional[Path]:
+    """
+    把 URL 中的任务ID和文件名解析为历史记录目录下的图片路径
+
+    task_id、filename 必须是单独一级名称（不含路径分隔符和 ".."），
+    文件名必须是图片扩展名，且解析后的路径必须位于历史记录目录之内。
+
+    Returns:
+        图片路径；参数不合法时返回 None
+    """
+    for part in (task_id, filename):
+        if not part or "/" in part or "\\" in part or ".." in part or part == ".":
+            return None
+    if os.path.splitext(filename)[1].lower() not in _IMAGE_EXTENSIONS:
+        return None
+
+    history_root = _HISTORY_ROOT.resolve()
+    path = (history_root / task_id / filename).resolve()
+    if not path.is_relative_to(history_root):
+        return None
+    return path
+
+
+def get_thumbnail(task_id: str, filename: str) -> Optional[str]:
+    """
+    获取缩略图路径，缩略图在首次请求时才生成
+
+    图片生成时不再同步生成缩略图，用户从未查看的图片不会产生压缩开销。
+    不依赖 ImageService 实例，未配置图片服务商时也可以浏览历史图片。
+
+    Args:
+        task_id: 任务ID
+        filename: 原图文件名
+
+    Returns:
+        缩略图完整路径；参数不合法、原图不存在或缩略图生成失败时返回 None
+    """
+    image_path = resolve_image_path(task_id, filename)
+    if image_path is None:
+        return None
+    thumbnail_path = str(image_path.with_name(f"thumb_{image_path.name}"))
+    if os.path.exists(thumbnail_path):
+        return thumbnail_path
+
+    with _thumbnail_locks_guard:
+        entry = _thumbnail_locks.setdefault(thumbnail_path, [threading.Lock(), 0])
+        entry[1] += 1
+        lock = entry[0]
+
+    try:
+        with lock:
+            # 双重检查：等待锁期间其他请求可能已经生成了缩略图
+            if os.path.exists(thumbnail_path):
+                return thumbnail_path
+
+            try:
+                with open(image_path, "rb") as f:
+                    image_data = f.read()
+            except FileNotFoundError:
+                return None
+
+            if _write_thumbnail(image_data, thumbnail_path):
+                return thumbnail_path
+            return None
+    finally:
+        # 还有其他请求在等待同一把锁时保留，避免后来的请求创建新锁后与等待者并发生成
+        with _thumbnail_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _thumbnail_locks[thumbnail_path]
+
+
+def _open_new_version(task_path: Path, filename: str) -> Tuple[int, str]:
+    """
+    以独占方式创建图片文件，文件已存在时依次尝试 "0_v1.png"、"0_v2.png" ...
+
+    O_EXCL 把“检查是否存在”和“创建”合并成一次系统调用，
+    多个工作线程同时保存同一页时也不会互相覆盖。
+
+    Returns:
+        (文件描述符, 实际文件名)
+    """
+    base_name, ext = os.path.splitext(filename)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    candidate = filename
+    version = 0
+    while True:
+        try:
+            fd = os.open(task_path / candidate, flags, 0o644)
+            return fd, candidate
+        except FileExistsError:
+            version += 1
+            candidate = f"{base_name}_v{version}{ext}"
+
+
+def _holding_executor(method):
+    """
+    标记使用生成线程池的生成器方法
+
+    生成器运行期间（包括 SSE 客户端断开后生成器被关闭之前）计入活跃生成数，
+    服务被关闭时线程池会等到所有活跃生成结束后才关闭。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._acquire_executor()
+        try:
+            yield from method(self, *args, **kwargs)
+        finally:
+            self._release_executor()
+    return wrapper
+
+
 class ImageService:
     """图片生成服务类"""
 
     # 并发配置
     MAX_CONCURRENT = 15  # 最大并发数
     AUTO_RETRY_COUNT = 1  # 不自动重试，超时后让用户手动重试
+    MAX_TASKS = 64  # 内存中最多保留的任务状态数，超出后淘汰最久未使用的任务
 
     def __init__(self, provider_name: str = None):
         """
@@ -56,6 +310,10 @@ class ImageService:
         # 保存配置信息
         self.provider_name = provider_name
         self.provider_config = provider_config
+        self._provider_type = provider_type
+
+        # 按服务商类型预先绑定生成参数，生成每页时不再查询配置
+        self._dispatch = self._build_dispatch()
 
         # 检查是否启用短 prompt 模式
         self.use_short_prompt = provider_config.get('short_prompt', False)
@@ -65,37 +323,118 @@ class ImageService:
         self.prompt_template_short = self._load_prompt_template(short=True)
 
         # 历史记录根目录
-        self.history_root_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            "history"
-        )
-        os.makedirs(self.history_root_dir, exist_ok=True)
+        self._history_root = _HISTORY_ROOT
+        self._history_root.mkdir(parents=True, exist_ok=True)
+        self.history_root_dir = str(self._history_root)
 
         # 当前任务的输出目录（每个任务一个子文件夹）
         self.current_task_dir = None
 
-        # 存储任务状态（用于重试）
-        self._task_states: Dict[str, Dict] = {}
+        # 存储任务状态（用于重试），按最近使用顺序排列，最多保留 MAX_TASKS 个
+        self._task_states: "OrderedDict[str, Dict]" = OrderedDict()
+        self._task_states_lock = threading.Lock()
+
+        # 长期复用的生成线程池（避免每次生成/重试都创建和销毁线程）
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.MAX_CONCURRENT,
+            thread_name_prefix="imgsvc"
+        )
+        # 正在使用线程池的生成数；服务关闭后等它归零再关闭线程池
+        self._active_generations = 0
+        self._closed = False
+        self._executor_lock = threading.Lock()
 
         logger.info(f"ImageService 初始化完成: provider={provider_name}, type={provider_type}")
 
+    def _build_dispatch(self) -> Callable[[str, Optional[Union[bytes, Future]], Optional[List[bytes]]], bytes]:
+        """
+        根据服务商类型构建图片生成函数
+
+        Returns:
+            函数 (prompt, reference_image, user_images) -> 图片数据
+        """
+        config = self.provider_config
+        generate_image = self.generator.generate_image
+        resolve_reference = self._resolve_reference
+
+        if self._provider_type == 'google_genai':
+            aspect_ratio = config.get('default_aspect_ratio', '3:4')
+            temperature = config.get('temperature', 1.0)
+            model = config.get('model', 'gemini-3-pro-image-preview')
+
+            def _gen_google_genai(prompt, reference_image, user_images):
+                logger.debug("  使用 Google GenAI 生成器")
+                return generate_image(
+                    prompt=prompt,
+                    aspect_ratio=aspect_ratio,
+                    temperature=temperature,
+                    model=model,
+                    reference_image=resolve_reference(reference_image),
+                )
+
+            return _gen_google_genai
+
+        if self._provider_type == 'image_api':
+            aspect_ratio = config.get('default_aspect_ratio', '3:4')
+            temperature = config.get('temperature', 1.0)
+            model = config.get('model', 'nano-banana-2')
+
+            def _gen_image_api(prompt, reference_image, user_images):
+                logger.debug("  使用 Image API 生成器")
+                # Image API 支持多张参考图片
+                # 组合参考图片：用户上传的图片 + 封面图
+                reference_images = []
+                if user_images:
+                    reference_images.extend(user_images)
+                reference_image = resolve_reference(reference_image)
+                if reference_image:
+                    reference_images.append(reference_image)
+
+                return generate_image(
+                    prompt=prompt,
+                    aspect_ratio=aspect_ratio,
+                    temperature=temperature,
+                    model=model,
+                    reference_images=reference_images if reference_images else None,
+                )
+
+            return _gen_image_api
+
+        size = config.get('default_size', '1024x1024')
+        model = config.get('model')
+        quality = config.get('quality', 'standard')
+
+        def _gen_openai(prompt, reference_image, user_images):
+            logger.debug("  使用 OpenAI 兼容生成器")
+            return generate_image(
+                prompt=prompt,
+                size=size,
+                model=model,
+                quality=quality,
+            )
+
+        return _gen_openai
+
     def _load_prompt_template(self, short: bool = False) -> str:
         """加载 Prompt 模板"""
         filename = "image_prompt_short.txt" if short else "image_prompt.txt"
-        prompt_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            "prompts",
-            filename
-        )
-        if not os.path.exists(prompt_path):
+        prompt_path = os.path.join(_PROMPTS_DIR, filename)
+        try:
+            mtime_ns = os.stat(prompt_path).st_mtime_ns
+        except FileNotFoundError:
             # 如果短模板不存在，返回空字符串
             return ""
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
+        return _read_template(prompt_path, mtime_ns)
 
-    def _save_image(self, image_data: bytes, filename: str, task_dir: str = None, auto_version: bool = False) -> str:
+    def _save_image(
+        self,
+        image_data: bytes,
+        filename: str,
+        task_dir: Optional[Union[str, Path]] = None,
+        auto_version: bool = False
+    ) -> str:
         """
-        保存图片到本地，同时生成缩略图
+        保存图片到本地（缩略图在首次请求时由 get_thumbnail 生成）
 
         Args:
             image_data: 图片二进制数据
@@ -111,34 +450,21 @@ class ImageService:
 
         if task_dir is None:
             raise ValueError("任务目录未设置")
+        task_path = Path(task_dir)
 
-        base_name, ext = os.path.splitext(filename)
-        
-        # 自动版本处理
+        # 保存图片（自动版本处理：独占创建，已存在则顺延版本号）
         if auto_version:
-            filepath = os.path.join(task_dir, filename)
-            if os.path.exists(filepath):
-                # 查找现有版本
-                version = 1
-                while True:
-                    v_filename = f"{base_name}_v{version}{ext}"
-                    v_filepath = os.path.join(task_dir, v_filename)
-                    if not os.path.exists(v_filepath):
-                        filename = v_filename
-                        break
-                    version += 1
-
-        # 保存图片
-        filepath = os.path.join(task_dir, filename)
-        with open(filepath, "wb") as f:
-            f.write(image_data)
-
-        # 生成缩略图
-        thumbnail_data = compress_image(image_data, max_size_kb=50)
-        thumbnail_filename = f"thumb_{filename}"
-        thumbnail_path = os.path.join(task_dir, thumbnail_filename)
-        with open(thumbnail_path, "wb") as f:
-            f.write(thumbnail_data)
+            fd, filename = _open_new_version(task_path, filename)
+            _write_fd(fd, image_data)
+        else:
+            _raw_write(task_path / filename, image_data)
+
+        # 覆盖写入时删除旧缩略图，下次请求时重新生成
+        if not auto_version:
+            try:
+                os.remove(task_path / f"thumb_{filename}")
+            except FileNotFoundError:
+                pass
 
         return filename
 
@@ -146,12 +472,12 @@ class ImageService:
         self,
         page: Dict,
         task_id: str,
-        reference_image: Optional[bytes] = None,
+        reference_image: Optional[Union[bytes, Future]] = None,
         retry_count: int = 0,
         full_outline: str = "",
         user_images: Optional[List[bytes]] = None,
         user_topic: str = "",
-        brand_style: Optional[str] = None,
+        task_prompt: Optional[Callable[[Dict, str, str], str]] = None,
         use_logo: bool = False
     ) -> Tuple[int, bool, Optional[str], Optional[str]]:
         """
@@ -160,80 +486,30 @@ class ImageService:
         Args:
             page: 页面数据
             task_id: 任务ID
-            reference_image: 参考图片（封面图）
+            reference_image: 参考图片（封面图），可以是尚未完成压缩的 Future，
+                只有需要参考图的服务商才会等待它
             retry_count: 当前重试次数
             full_outline: 完整的大纲文本
             user_images: 用户上传的参考图片列表
             user_topic: 用户原始输入
-            brand_style: 品牌风格Prompt
+            task_prompt: 由 _make_task_prompt 生成的 Prompt 构建函数（已包含品牌风格），
+                为空时按无品牌风格构建
 
         Returns:
             (index, success, filename, error_message)
         """
         index = page["index"]
         page_type = page["type"]
-        page_content = page["content"]
 
         try:
             logger.debug(f"生成图片 [{index}]: type={page_type}")
 
-            # 根据配置选择模板（短 prompt 或完整 prompt）
-            if self.use_short_prompt and self.prompt_template_short:
-                # 短 prompt 模式：只包含页面类型和内容
-                prompt = self.prompt_template_short.format(
-                    page_content=page_content,
-                    page_type=page_type
-                )
-                logger.debug(f"  使用短 prompt 模式 ({len(prompt)} 字符)")
-            else:
-                # 完整 prompt 模式：包含大纲和用户需求
-                prompt = self.prompt_template.format(
-                    page_content=page_content,
-                    page_type=page_type,
-                    full_outline=full_outline,
-                    user_topic=user_topic if user_topic else "未提供"
-                )
+            if task_prompt is None:
+                task_prompt = self._make_task_prompt(None)
+            prompt = task_prompt(page, full_outline, user_topic)
 
-            # 注入品牌风格
-            if brand_style:
-                prompt = f"{brand_style}\n\n{prompt}"
-                logger.debug(f"  已注入品牌风格 ({len(brand_style)} 字符)")
-
-            # 调用生成器生成图片
-            if self.provider_config.get('type') == 'google_genai':
-                logger.debug(f"  使用 Google GenAI 生成器")
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                    temperature=self.provider_config.get('temperature', 1.0),
-                    model=self.provider_config.get('model', 'gemini-3-pro-image-preview'),
-                    reference_image=reference_image,
-                )
-            elif self.provider_config.get('type') == 'image_api':
-                logger.debug(f"  使用 Image API 生成器")
-                # Image API 支持多张参考图片
-                # 组合参考图片：用户上传的图片 + 封面图
-                reference_images = []
-                if user_images:
-                    reference_images.extend(user_images)
-                if reference_image:
-                    reference_images.append(reference_image)
-
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                    temperature=self.provider_config.get('temperature', 1.0),
-                    model=self.provider_config.get('model', 'nano-banana-2'),
-                    reference_images=reference_images if reference_images else None,
-                )
-            else:
-                logger.debug(f"  使用 OpenAI 兼容生成器")
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    size=self.provider_config.get('default_size', '1024x1024'),
-                    model=self.provider_config.get('model'),
-                    quality=self.provider_config.get('quality', 'standard'),
-                )
+            # 调用生成器生成图片（服务商参数已在初始化时绑定）
+            image_data = self._dispatch(prompt, reference_image, user_images)
 
             # 叠加品牌 Logo
             if use_logo:
@@ -247,7 +523,9 @@ class ImageService:
 
             # 保存图片（使用当前任务目录，开启自动版本）
             filename = f"{index}.png"
-            actual_filename = self._save_image(image_data, filename, self.current_task_dir, auto_version=True)
+            actual_filename = self._save_image(
+                image_data, filename, self._history_root / task_id, auto_version=True
+            )
             logger.info(f"✅ 图片 [{index}] 生成成功: {actual_filename}")
 
             return (index, True, actual_filename, None)
@@ -257,6 +535,110 @@ class ImageService:
             logger.error(f"❌ 图片 [{index}] 生成失败: {error_msg[:200]}")
             return (index, False, None, error_msg)
 
+    def _make_task_prompt(self, brand_style: Optional[str]) -> Callable[[Dict, str, str], str]:
+        """
+        构建任务级的 Prompt 构建函数
+
+        模板选择和品牌风格注入在每个任务开始时完成一次，
+        品牌风格作为固定前缀并入预编译模板。
+
+        Args:
+            brand_style: 品牌风格Prompt
+
+        Returns:
+            接收 (page, full_outline, user_topic)、返回完整 Prompt 的函数
+        """
+        prefix = f"{brand_style}\n\n" if brand_style else ""
+
+        # 根据配置选择模板（短 prompt 或完整 prompt）
+        if self.use_short_prompt and self.prompt_template_short:
+            # 短 prompt 模式：只包含页面类型和内容
+            logger.debug("  使用短 prompt 模式")
+            render = _compile_template(self.prompt_template_short, prefix)
+
+            def task_prompt(page: Dict, full_outline: str, user_topic: str) -> str:
+                return render({
+                    "page_content": page["content"],
+                    "page_type": page["type"]
+                })
+        else:
+            # 完整 prompt 模式：包含大纲和用户需求
+            render = _compile_template(self.prompt_template, prefix)
+
+            def task_prompt(page: Dict, full_outline: str, user_topic: str) -> str:
+                return render({
+                    "page_content": page["content"],
+                    "page_type": page["type"],
+                    "full_outline": full_outline,
+                    "user_topic": user_topic if user_topic else "未提供"
+                })
+
+        if brand_style:
+            logger.debug(f"  已注入品牌风格 ({len(brand_style)} 字符)")
+        return task_prompt
+
+    def _generate_with_cover_ref(
+        self,
+        page: Dict,
+        task_id: str,
+        cover_ref: List[Optional[Union[bytes, Future]]],
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        task_prompt: Optional[Callable[[Dict, str, str], str]] = None,
+        use_logo: bool = False
+    ) -> Tuple[int, bool, Optional[str], Optional[str]]:
+        """
+        推测执行模式下生成内容页
+
+        在工作线程真正开始执行时读取 cover_ref[0]：封面已生成则作为参考图（可能仍在压缩中，需要时再等待），
+        否则不带封面参考直接生成。
+        """
+        return self._generate_single_image(
+            page, task_id, cover_ref[0], 0, full_outline,
+            user_images, user_topic, task_prompt, use_logo
+        )
+
+    @staticmethod
+    def _resolve_reference(reference_image: Optional[Union[bytes, Future]]) -> Optional[bytes]:
+        """获取参考图数据（如果是 Future 则等待封面压缩完成，失败时不使用参考图）"""
+        if isinstance(reference_image, Future):
+            try:
+                return reference_image.result()
+            except Exception as e:
+                logger.warning(f"加载封面参考图失败，不使用封面参考: {e}")
+                return None
+        return reference_image
+
+    @staticmethod
+    def _run_tracked(events: queue.Queue, fn: Callable, page: Dict, *args) -> Tuple:
+        """在线程池中执行生成函数，真正开始执行时向事件队列报告"""
+        events.put(("start", page))
+        return fn(page, *args)
+
+    @classmethod
+    def _submit_cover_reference(cls, task_state: Dict, task_path: Path, filename: str) -> Future:
+        """在压缩线程池中读取并压缩封面参考图，完成后写入任务状态（失败时只记录警告）"""
+        def _store_cover(future: Future):
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                task_state["cover_image"] = future.result()
+            else:
+                logger.warning(f"加载封面参考图失败: {future.exception()}")
+
+        future = _compress_executor.submit(cls._load_cover_reference, task_path, filename)
+        future.add_done_callback(_store_cover)
+        return future
+
+    @staticmethod
+    def _load_cover_reference(task_path: Path, filename: str) -> bytes:
+        """读取封面图片作为参考，并立即压缩到200KB以内（减少内存占用和后续传输开销）"""
+        with open(task_path / filename, "rb") as f:
+            cover_image_data = f.read()
+        return compress_image(cover_image_data, max_size_kb=200)
+
+    @_holding_executor
     def generate_images(
         self,
         pages: list,
@@ -268,6 +650,7 @@ class ImageService:
         """
         生成图片（生成器，支持 SSE 流式返回）
         优化版本：先生成封面，然后并发生成其他页面
+        （高并发且启用 speculative_content 时，封面与内容页同时提交）
 
         Args:
             pages: 页面列表
@@ -285,169 +668,226 @@ class ImageService:
         logger.info(f"开始图片生成任务: task_id={task_id}, pages={len(pages)}")
 
         # 创建任务专属目录
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
-        logger.debug(f"任务目录: {self.current_task_dir}")
+        task_path = self._history_root / task_id
+        task_path.mkdir(parents=True, exist_ok=True)
+        self.current_task_dir = str(task_path)
+        logger.debug(f"任务目录: {task_path}")
 
         total = len(pages)
-        generated_images = []
-        failed_pages = []
+        done = 0
+        failed_indices = []
         cover_image_data = None
 
         # 压缩用户上传的参考图到200KB以内（减少内存和传输开销）
         compressed_user_images = None
         if user_images:
-            compressed_user_images = [compress_image(img, max_size_kb=200) for img in user_images]
+            compressed_user_images = list(_compress_executor.map(
+                lambda img: compress_image(img, max_size_kb=200), user_images
+            ))
 
         # 获取当前激活品牌的风格Prompt
         brand_style = _get_active_brand_style()
         if brand_style:
             logger.info(f"使用品牌风格生成图片 ({len(brand_style)} 字符)")
+        task_prompt = self._make_task_prompt(brand_style)
 
         # 初始化任务状态
-        self._task_states[task_id] = {
+        task_state = self._put_state(task_id, {
             "pages": pages,
-            "generated": {},
-            "failed": {},
+            # page["index"] -> 页面状态（按页码建字典，客户端传入的负数或很大的页码不会覆盖其他页、也不会撑大列表）
+            "page_states": {},
             "cover_image": None,
             "full_outline": full_outline,
             "user_images": compressed_user_images,
             "user_topic": user_topic,
             "brand_style": brand_style
-        }
+        })
 
-        # ==================== 第一阶段：生成封面 ====================
-        cover_page = None
-        other_pages = []
-
-        for page in pages:
-            if page["type"] == "cover":
-                cover_page = page
-            else:
-                other_pages.append(page)
-
-        # 如果没有封面，使用第一页作为封面
-        if cover_page is None and len(pages) > 0:
-            cover_page = pages[0]
-            other_pages = pages[1:]
-
-        if cover_page:
-            # 发送封面生成进度
-            yield {
-                "event": "progress",
-                "data": {
-                    "index": cover_page["index"],
-                    "status": "generating",
-                    "message": "正在生成封面...",
-                    "current": 1,
-                    "total": total,
-                    "phase": "cover"
-                }
-            }
+        try:
+            # ==================== 第一阶段：生成封面 ====================
+            cover_page = None
+            other_pages = []
 
-            # 生成封面（使用用户上传的图片作为参考）
-            index, success, filename, error = self._generate_single_image(
-                cover_page, task_id, reference_image=None, full_outline=full_outline,
-                user_images=compressed_user_images, user_topic=user_topic, brand_style=brand_style,
-                use_logo=cover_page.get("use_logo", False)
-            )
+            for page in pages:
+                if page["type"] == "cover":
+                    cover_page = page
+                else:
+                    other_pages.append(page)
 
-            if success:
-                generated_images.append(filename)
-                self._task_states[task_id]["generated"][index] = filename
+            # 如果没有封面，使用第一页作为封面
+            if cover_page is None and len(pages) > 0:
+                cover_page = pages[0]
+                other_pages = pages[1:]
 
-                # 读取封面图片作为参考，并立即压缩到200KB以内
-                cover_path = os.path.join(self.current_task_dir, filename)
-                with open(cover_path, "rb") as f:
-                    cover_image_data = f.read()
+            # 检查是否启用高并发模式
+            high_concurrency = self.provider_config.get('high_concurrency', False)
 
-                # 压缩封面图（减少内存占用和后续传输开销）
-                cover_image_data = compress_image(cover_image_data, max_size_kb=200)
-                self._task_states[task_id]["cover_image"] = cover_image_data
+            # 推测执行模式：封面和内容页同时提交到线程池，不等待封面完成
+            speculative = (
+                high_concurrency
+                and self.provider_config.get('speculative_content', False)
+                and cover_page is not None
+                and len(other_pages) > 0
+            )
 
+            if cover_page:
+                # 发送封面生成进度
                 yield {
-                    "event": "complete",
+                    "event": "progress",
                     "data": {
-                        "index": index,
-                        "status": "done",
-                        "image_url": f"/api/images/{task_id}/{filename}",
+                        "index": cover_page["index"],
+                        "status": "generating",
+                        "message": "正在生成封面...",
+                        "current": 1,
+                        "total": total,
                         "phase": "cover"
                     }
                 }
-            else:
-                failed_pages.append(cover_page)
-                self._task_states[task_id]["failed"][index] = error
 
-                yield {
-                    "event": "error",
-                    "data": {
-                        "index": index,
-                        "status": "error",
-                        "message": error,
-                        "retryable": True,
-                        "phase": "cover"
-                    }
-                }
+            if cover_page and not speculative:
+                # 生成封面（使用用户上传的图片作为参考）
+                index, success, filename, error = self._generate_single_image(
+                    cover_page, task_id, reference_image=None, full_outline=full_outline,
+                    user_images=compressed_user_images, user_topic=user_topic, task_prompt=task_prompt,
+                    use_logo=cover_page.get("use_logo", False)
+                )
 
-        # ==================== 第二阶段：生成其他页面 ====================
-        if other_pages:
-            # 检查是否启用高并发模式
-            high_concurrency = self.provider_config.get('high_concurrency', False)
+                if success:
+                    done += 1
+                    self._mark_done(task_state, index, filename)
 
-            if high_concurrency:
-                # 高并发模式：并行生成
-                yield {
-                    "event": "progress",
-                    "data": {
-                        "status": "batch_start",
-                        "message": f"开始并发生成 {len(other_pages)} 页内容...",
-                        "current": len(generated_images),
-                        "total": total,
-                        "phase": "content"
+                    # 封面的读取和压缩放到压缩线程池中，与内容页的提交并行；
+                    # 内容页只有在服务商需要参考图时才会等待它完成
+                    cover_image_data = self._submit_cover_reference(task_state, task_path, filename)
+
+                    yield {
+                        "event": "complete",
+                        "data": {
+                            "index": index,
+                            "status": "done",
+                            "image_url": f"/api/images/{task_id}/{filename}",
+                            "phase": "cover"
+                        }
                     }
-                }
+                else:
+                    failed_indices.append(cover_page["index"])
+                    self._mark_failed(task_state, index, error)
 
-                # 使用线程池并发生成
-                with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT) as executor:
-                    # 提交所有任务
-                    future_to_page = {
-                        executor.submit(
-                            self._generate_single_image,
-                            page,
-                            task_id,
-                            cover_image_data,  # 使用封面作为参考
-                            0,  # retry_count
-                            full_outline,  # 传入完整大纲
-                            compressed_user_images,  # 用户上传的参考图片（已压缩）
-                            user_topic,  # 用户原始输入
-                            brand_style,  # 品牌风格
-                            page.get("use_logo", False)
-                        ): page
-                        for page in other_pages
+                    yield {
+                        "event": "error",
+                        "data": {
+                            "index": index,
+                            "status": "error",
+                            "message": error,
+                            "retryable": True,
+                            "phase": "cover"
+                        }
                     }
 
-                    # 发送每个页面的进度
-                    for page in other_pages:
-                        yield {
-                            "event": "progress",
-                            "data": {
-                                "index": page["index"],
-                                "status": "generating",
-                                "current": len(generated_images) + 1,
-                                "total": total,
-                                "phase": "content"
-                            }
+            # ==================== 第二阶段：生成其他页面 ====================
+            if other_pages:
+                if high_concurrency:
+                    # 高并发模式：并行生成
+                    yield {
+                        "event": "progress",
+                        "data": {
+                            "status": "batch_start",
+                            "message": f"开始并发生成 {len(other_pages)} 页内容...",
+                            "current": done,
+                            "total": total,
+                            "phase": "content"
                         }
+                    }
 
-                    # 收集结果
-                    for future in as_completed(future_to_page):
+                    # 提交所有任务：页面真正开始生成时报告 "start"，完成时报告 "done"，
+                    # 排队中的页面不会提前显示为生成中
+                    events = queue.Queue()
+                    future_to_page = {}
+
+                    def _submit(fn, page, *args):
+                        future = self._executor.submit(self._run_tracked, events, fn, page, *args)
+                        future_to_page[future] = page
+                        future.add_done_callback(lambda f: events.put(("done", f)))
+
+                    if speculative:
+                        # 封面先提交，保证它最先开始生成
+                        _submit(
+                            self._generate_single_image,
+                            cover_page,
+                            task_id,
+                            None,  # 封面不使用参考图
+                            0,
+                            full_outline,
+                            compressed_user_images,
+                            user_topic,
+                            task_prompt,
+                            cover_page.get("use_logo", False)
+                        )
+
+                        # 内容页在真正开始生成时才读取封面参考图：
+                        # 封面已完成的使用封面参考，已在生成中的不再等待封面
+                        cover_ref = [None]
+                        for page in other_pages:
+                            _submit(
+                                self._generate_with_cover_ref,
+                                page,
+                                task_id,
+                                cover_ref,
+                                full_outline,
+                                compressed_user_images,
+                                user_topic,
+                                task_prompt,
+                                page.get("use_logo", False)
+                            )
+                    else:
+                        for page in other_pages:
+                            _submit(
+                                self._generate_single_image,
+                                page,
+                                task_id,
+                                cover_image_data,  # 使用封面作为参考
+                                0,  # retry_count
+                                full_outline,  # 传入完整大纲
+                                compressed_user_images,  # 用户上传的参考图片（已压缩）
+                                user_topic,  # 用户原始输入
+                                task_prompt,  # 已注入品牌风格的 Prompt 构建函数
+                                page.get("use_logo", False)
+                            )
+
+                    # 收集结果：开始事件转为进度推送，完成事件转为结果推送
+                    remaining = len(future_to_page)
+                    while remaining:
+                        kind, item = events.get()
+                        if kind == "start":
+                            # 封面的生成进度已在前面推送过
+                            if item is not cover_page:
+                                yield {
+                                    "event": "progress",
+                                    "data": {
+                                        "index": item["index"],
+                                        "status": "generating",
+                                        "current": done + 1,
+                                        "total": total,
+                                        "phase": "content"
+                                    }
+                                }
+                            continue
+
+                        remaining -= 1
+                        future = item
                         page = future_to_page[future]
+                        phase = "cover" if page is cover_page else "content"
                         try:
                             index, success, filename, error = future.result()
 
                             if success:
-                                generated_images.append(filename)
-                                self._task_states[task_id]["generated"][index] = filename
+                                done += 1
+                                self._mark_done(task_state, index, filename)
+
+                                if page is cover_page:
+                                    # 推测执行模式下封面完成，后续开始的内容页将使用封面参考；
+                                    # 读取和压缩在压缩线程池中进行，不阻塞事件推送，失败时内容页不使用参考图
+                                    cover_ref[0] = self._submit_cover_reference(task_state, task_path, filename)
 
                                 yield {
                                     "event": "complete",
@@ -455,12 +895,12 @@ class ImageService:
                                         "index": index,
                                         "status": "done",
                                         "image_url": f"/api/images/{task_id}/{filename}",
-                                        "phase": "content"
+                                        "phase": phase
                                     }
                                 }
                             else:
-                                failed_pages.append(page)
-                                self._task_states[task_id]["failed"][index] = error
+                                failed_indices.append(page["index"])
+                                self._mark_failed(task_state, index, error)
 
                                 yield {
                                     "event": "error",
@@ -469,14 +909,14 @@ class ImageService:
                                         "status": "error",
                                         "message": error,
                                         "retryable": True,
-                                        "phase": "content"
+                                        "phase": phase
                                     }
                                 }
 
                         except Exception as e:
-                            failed_pages.append(page)
+                            failed_indices.append(page["index"])
                             error_msg = str(e)
-                            self._task_states[task_id]["failed"][page["index"]] = error_msg
+                            self._mark_failed(task_state, page["index"], error_msg)
 
                             yield {
                                 "event": "error",
@@ -485,87 +925,95 @@ class ImageService:
                                     "status": "error",
                                     "message": error_msg,
                                     "retryable": True,
-                                    "phase": "content"
+                                    "phase": phase
                                 }
                             }
-            else:
-                # 顺序模式：逐个生成
-                yield {
-                    "event": "progress",
-                    "data": {
-                        "status": "batch_start",
-                        "message": f"开始顺序生成 {len(other_pages)} 页内容...",
-                        "current": len(generated_images),
-                        "total": total,
-                        "phase": "content"
-                    }
-                }
-
-                for page in other_pages:
-                    # 发送生成进度
+                else:
+                    # 顺序模式：逐个生成
                     yield {
                         "event": "progress",
                         "data": {
-                            "index": page["index"],
-                            "status": "generating",
-                            "current": len(generated_images) + 1,
+                            "status": "batch_start",
+                            "message": f"开始顺序生成 {len(other_pages)} 页内容...",
+                            "current": done,
                             "total": total,
                             "phase": "content"
                         }
                     }
 
-                    # 生成单张图片
-                    index, success, filename, error = self._generate_single_image(
-                        page,
-                        task_id,
-                        cover_image_data,
-                        0,
-                        full_outline,
-                        compressed_user_images,
-                        user_topic,
-                        brand_style,
-                        page.get("use_logo", False)
-                    )
-
-                    if success:
-                        generated_images.append(filename)
-                        self._task_states[task_id]["generated"][index] = filename
-
+                    for page in other_pages:
+                        # 发送生成进度
                         yield {
-                            "event": "complete",
+                            "event": "progress",
                             "data": {
-                                "index": index,
-                                "status": "done",
-                                "image_url": f"/api/images/{task_id}/{filename}",
+                                "index": page["index"],
+                                "status": "generating",
+                                "current": done + 1,
+                                "total": total,
                                 "phase": "content"
                             }
                         }
-                    else:
-                        failed_pages.append(page)
-                        self._task_states[task_id]["failed"][index] = error
 
-                        yield {
-                            "event": "error",
-                            "data": {
-                                "index": index,
-                                "status": "error",
-                                "message": error,
-                                "retryable": True,
-                                "phase": "content"
+                        # 生成单张图片
+                        index, success, filename, error = self._generate_single_image(
+                            page,
+                            task_id,
+                            cover_image_data,
+                            0,
+                            full_outline,
+                            compressed_user_images,
+                            user_topic,
+                            task_prompt,
+                            page.get("use_logo", False)
+                        )
+
+                        if success:
+                            done += 1
+                            self._mark_done(task_state, index, filename)
+
+                            yield {
+                                "event": "complete",
+                                "data": {
+                                    "index": index,
+                                    "status": "done",
+                                    "image_url": f"/api/images/{task_id}/{filename}",
+                                    "phase": "content"
+                                }
                             }
-                        }
+                        else:
+                            failed_indices.append(page["index"])
+                            self._mark_failed(task_state, index, error)
+
+                            yield {
+                                "event": "error",
+                                "data": {
+                                    "index": index,
+                                    "status": "error",
+                                    "message": error,
+                                    "retryable": True,
+                                    "phase": "content"
+                                }
+                            }
+        finally:
+            # 用户上传的参考图只用于首轮生成，完成后释放，避免长期占用内存；
+            # 之后的重试只使用封面作为参考。客户端中途断开、生成器被提前关闭时同样释放
+            task_state["user_images"] = None
 
         # ==================== 完成 ====================
         yield {
             "event": "finish",
             "data": {
-                "success": len(failed_pages) == 0,
+                "success": len(failed_indices) == 0,
                 "task_id": task_id,
-                "images": generated_images,
+                "images": [
+                    state.filename
+                    for _, state in sorted(task_state["page_states"].items())
+                    if state.filename
+                ],
                 "total": total,
-                "completed": len(generated_images),
-                "failed": len(failed_pages),
-                "failed_indices": [p["index"] for p in failed_pages]
+                "completed": done,
+                "failed": len(failed_indices),
+                "failed_indices": failed_indices
             }
         }
 
@@ -592,16 +1040,17 @@ class ImageService:
         Returns:
             生成结果
         """
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
+        task_path = self._history_root / task_id
+        task_path.mkdir(parents=True, exist_ok=True)
+        self.current_task_dir = str(task_path)
 
         reference_image = custom_reference_image
         user_images = None
         brand_style = None
 
         # 首先尝试从任务状态中获取上下文
-        if task_id in self._task_states:
-            task_state = self._task_states[task_id]
+        task_state = self._get_state(task_id)
+        if task_state is not None:
             # 如果没有自定义参考图，且指定了使用默认参考，则尝试获取封面图
             if not reference_image and use_reference:
                 reference_image = task_state.get("cover_image")
@@ -620,8 +1069,8 @@ class ImageService:
 
         # 如果没有参考图且指定了使用默认参考，尝试从文件系统加载封面
         if not reference_image and use_reference:
-            cover_path = os.path.join(self.current_task_dir, "0.png")
-            if os.path.exists(cover_path):
+            cover_path = task_path / "0.png"
+            if cover_path.exists():
                 with open(cover_path, "rb") as f:
                     cover_data = f.read()
                 # 压缩覆盖图到 200KB
@@ -635,15 +1084,13 @@ class ImageService:
             full_outline,
             user_images,
             user_topic,
-            brand_style,
+            self._make_task_prompt(brand_style),
             page.get("use_logo", False)
         )
 
         if success:
-            if task_id in self._task_states:
-                self._task_states[task_id]["generated"][index] = filename
-                if index in self._task_states[task_id]["failed"]:
-                    del self._task_states[task_id]["failed"][index]
+            if task_state is not None:
+                self._mark_done(task_state, index, filename)
 
             return {
                 "success": True,
@@ -658,6 +1105,7 @@ class ImageService:
                 "retryable": True
             }
 
+    @_holding_executor
     def retry_failed_images(
         self,
         task_id: str,
@@ -680,8 +1128,8 @@ class ImageService:
         user_topic = ""
         full_outline = ""
 
-        if task_id in self._task_states:
-            task_state = self._task_states[task_id]
+        task_state = self._get_state(task_id)
+        if task_state is not None:
             reference_image = task_state.get("cover_image")
             brand_style = task_state.get("brand_style")
             user_images = task_state.get("user_images")
@@ -692,6 +1140,8 @@ class ImageService:
         if brand_style is None:
             brand_style = _get_active_brand_style()
 
+        task_prompt = self._make_task_prompt(brand_style)
+
         total = len(pages)
         success_count = 0
         failed_count = 0
@@ -704,67 +1154,64 @@ class ImageService:
             }
         }
 
-        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT) as executor:
-            future_to_page = {
-                executor.submit(
-                    self._generate_single_image,
-                    page,
-                    task_id,
-                    reference_image,
-                    0,  # retry_count
-                    full_outline,  # 传入完整大纲
-                    user_images,
-                    user_topic,
-                    brand_style,  # 传入品牌风格
-                    page.get("use_logo", False)
-                ): page
-                for page in pages
-            }
+        future_to_page = {
+            self._executor.submit(
+                self._generate_single_image,
+                page,
+                task_id,
+                reference_image,
+                0,  # retry_count
+                full_outline,  # 传入完整大纲
+                user_images,
+                user_topic,
+                task_prompt,  # 已注入品牌风格的 Prompt 构建函数
+                page.get("use_logo", False)
+            ): page
+            for page in pages
+        }
 
-            for future in as_completed(future_to_page):
-                page = future_to_page[future]
-                try:
-                    index, success, filename, error = future.result()
+        for future in as_completed(future_to_page):
+            page = future_to_page[future]
+            try:
+                index, success, filename, error = future.result()
 
-                    if success:
-                        success_count += 1
-                        if task_id in self._task_states:
-                            self._task_states[task_id]["generated"][index] = filename
-                            if index in self._task_states[task_id]["failed"]:
-                                del self._task_states[task_id]["failed"][index]
+                if success:
+                    success_count += 1
+                    if task_state is not None:
+                        self._mark_done(task_state, index, filename)
 
-                        yield {
-                            "event": "complete",
-                            "data": {
-                                "index": index,
-                                "status": "done",
-                                "image_url": f"/api/images/{task_id}/{filename}"
-                            }
-                        }
-                    else:
-                        failed_count += 1
-                        yield {
-                            "event": "error",
-                            "data": {
-                                "index": index,
-                                "status": "error",
-                                "message": error,
-                                "retryable": True
-                            }
+                    yield {
+                        "event": "complete",
+                        "data": {
+                            "index": index,
+                            "status": "done",
+                            "image_url": f"/api/images/{task_id}/{filename}"
                         }
-
-                except Exception as e:
+                    }
+                else:
                     failed_count += 1
                     yield {
                         "event": "error",
                         "data": {
-                            "index": page["index"],
+                            "index": index,
                             "status": "error",
-                            "message": str(e),
+                            "message": error,
                             "retryable": True
                         }
                     }
 
+            except Exception as e:
+                failed_count += 1
+                yield {
+                    "event": "error",
+                    "data": {
+                        "index": page["index"],
+                        "status": "error",
+                        "message": str(e),
+                        "retryable": True
+                    }
+                }
+
         yield {
             "event": "retry_finish",
             "data": {
@@ -817,8 +1264,8 @@ class ImageService:
         """
         编辑图片 (In-painting)
         """
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        if not os.path.exists(self.current_task_dir):
+        task_path = self._history_root / task_id
+        if not task_path.exists():
             raise ValueError(f"任务目录不存在: {task_id}")
 
         # 获取原始图片 (尝试找最新的)
@@ -829,10 +1276,10 @@ class ImageService:
         
         # 暂时默认编辑 index.png 或其最新版本
         original_filename = f"{index}.png"
-        original_path = os.path.join(self.current_task_dir, original_filename)
+        original_path = task_path / original_filename
         
         # 如果有 versions，前端应该能指定。这里暂时用 index.png
-        if not os.path.exists(original_path):
+        if not original_path.exists():
             raise ValueError(f"原始图片不存在: {original_path}")
 
         with open(original_path, "rb") as f:
@@ -856,12 +1303,12 @@ class ImageService:
             # 保存新版本
             new_filename = f"{index}.png"
             # 开启 auto_version=True 会自动存为 0_v1.png, 0_v2.png 等
-            actual_filename = self._save_image(edited_data, new_filename, self.current_task_dir, auto_version=True)
+            actual_filename = self._save_image(edited_data, new_filename, task_path, auto_version=True)
             
             logger.info(f"✅ 图片 [{index}] 编辑成功: {actual_filename}")
 
             # 更新任务状态 (如果有的话)
-            if task_id in self._task_states:
+            if self._get_state(task_id) is not None:
                 # 这里可能需要支持列表来存储版本
                 pass
 
@@ -890,17 +1337,89 @@ class ImageService:
         Returns:
             完整路径
         """
-        task_dir = os.path.join(self.history_root_dir, task_id)
-        return os.path.join(task_dir, filename)
+        return str(self._history_root / task_id / filename)
+
+    @staticmethod
+    def _page_state(task_state: Dict, index: int) -> _PageState:
+        """获取指定页的状态（首次访问时创建）"""
+        page_states = task_state["page_states"]
+        state = page_states.get(index)
+        if state is None:
+            state = page_states[index] = _PageState()
+        return state
+
+    def _mark_done(self, task_state: Dict, index: int, filename: str):
+        """标记页面生成成功"""
+        state = self._page_state(task_state, index)
+        state.status = "done"
+        state.filename = filename
+        state.error = None
+
+    def _mark_failed(self, task_state: Dict, index: int, error: str):
+        """标记页面生成失败"""
+        state = self._page_state(task_state, index)
+        state.status = "error"
+        state.error = error
+
+    def _put_state(self, task_id: str, state: Dict) -> Dict:
+        """
+        保存任务状态，超出 MAX_TASKS 时淘汰最久未使用的任务
+
+        Returns:
+            保存的任务状态（调用方直接修改该字典即可更新状态）
+        """
+        with self._task_states_lock:
+            self._task_states[task_id] = state
+            self._task_states.move_to_end(task_id)
+            self._evict_if_full()
+        return state
+
+    def _get_state(self, task_id: str) -> Optional[Dict]:
+        """获取任务状态，并标记为最近使用"""
+        with self._task_states_lock:
+            state = self._task_states.get(task_id)
+            if state is not None:
+                self._task_states.move_to_end(task_id)
+            return state
+
+    def _evict_if_full(self):
+        """淘汰最久未使用的任务状态（调用方需持有 _task_states_lock）"""
+        while len(self._task_states) > self.MAX_TASKS:
+            evicted_id, _ = self._task_states.popitem(last=False)
+            logger.info(f"任务状态数超过上限 {self.MAX_TASKS}，已淘汰: {evicted_id}")
 
     def get_task_state(self, task_id: str) -> Optional[Dict]:
-        """获取任务状态"""
-        return self._task_states.get(task_id)
+        """获取任务状态（内存中最多保留 MAX_TASKS 个任务，更早的任务会被淘汰）"""
+        return self._get_state(task_id)
 
     def cleanup_task(self, task_id: str):
         """清理任务状态（释放内存）"""
-        if task_id in self._task_states:
-            del self._task_states[task_id]
+        with self._task_states_lock:
+            self._task_states.pop(task_id, None)
+
+    def _acquire_executor(self):
+        with self._executor_lock:
+            self._active_generations += 1
+
+    def _release_executor(self):
+        with self._executor_lock:
+            self._active_generations -= 1
+            idle = self._closed and self._active_generations == 0
+        if idle:
+            self._executor.shutdown(wait=False)
+
+    def close(self):
+        """
+        关闭线程池
+
+        仍有生成在进行时推迟到最后一个生成结束后再关闭，
+        已提交的页面会继续生成，不会被取消。
+        """
+        with self._executor_lock:
+            self._closed = True
+            idle = self._active_generations == 0
+        if idle:
+            self._executor.shutdown(wait=False)
 
 
 # 全局服务实例
@@ -916,4 +1435,6 @@ def get_image_service() -> ImageService:
 def reset_image_service():
     """重置全局服务实例（配置更新后调用）"""
     global _service_instance
+    if _service_instance is not None:
+        _service_instance.close()
     _service_instance = None
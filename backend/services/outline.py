@@ -1,42 +1,182 @@
+import functools
 import logging
 import os
 import re
 import base64
 import json
+import threading
 import yaml
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from backend.utils import file_cache
+from backend.utils.file_cache import load_yaml, read_text
 from backend.utils.text_client import get_text_chat_client
 
+# orjson 用于加速 JSON 解析（项目依赖；未安装时使用标准库）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# 文本生成配置文件路径
+_TEXT_CONFIG_PATH = Path(__file__).parent.parent.parent / 'text_providers.yaml'
+
+# Prompt 模板目录
+_PROMPTS_DIR = Path(__file__).resolve().parent.parent / 'prompts'
+
+# 大纲解析用的正则和页面类型映射（模块加载时编译一次）
+_PAGE_SPLIT_RE = re.compile(r'<page>', re.IGNORECASE)
+_TYPE_RE = re.compile(r"\[(\S+)\]")
+_TYPE_MAP = {
+    "封面": "cover",
+    "内容": "content",
+    "总结": "summary",
+}
+
+# 改写模式下传给模型的文章正文最大字符数
+# （正文不超过该长度时切片直接返回原字符串，不会产生拷贝）
+_ARTICLE_MAX_CHARS = 3000
+
+# 改写 Prompt 的占位符（模板中含 JSON 示例，不能使用 str.format）
+_REWRITE_PLACEHOLDER_RE = re.compile(r'\{(title|content|image_count)\}')
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+# 大纲生成错误分类规则：(关键词（小写）, 错误类型, 详细提示)，按顺序匹配第一条
+_ERROR_RULES = (
+    (
+        ("未配置 api key", "api_key"),
+        "missing_api_key",
+        "请先配置 API Key\n\n"
+        "请前往「系统设置」页面添加文本生成服务商配置，"
+        "或手动编辑 text_providers.yaml 文件。"
+    ),
+    (
+        ("未找到任何文本生成服务商配置",),
+        "no_provider",
+        "未配置文本生成服务商\n\n"
+        "请前往「系统设置」页面添加文本生成服务商，"
+        "支持 OpenAI、Google Gemini 等多种服务商。"
+    ),
+    (
+        ("unauthorized", "401"),
+        "auth_failed",
+        "API 认证失败\n\n"
+        "API Key 无效或已过期，请在「系统设置」中检查并更新。"
+    ),
+    (
+        ("model", "404"),
+        "model_error",
+        "模型访问失败\n\n"
+        "模型名称可能不正确，请在「系统设置」中检查配置。"
+    ),
+    (
+        ("timeout", "连接"),
+        "network_error",
+        "网络连接失败\n\n"
+        "请检查网络连接，或稍后重试。"
+    ),
+    (
+        ("rate", "429", "quota"),
+        "rate_limit",
+        "API 配额限制\n\n"
+        "API 调用次数超限，请等待配额重置或升级套餐。"
+    ),
+)
+
+
+def _iter_split(text: str, sep: str) -> Iterator[str]:
+    """按分隔符逐段切分文本（结果与 str.split 相同，但不一次性生成整个列表）"""
+    start = 0
+    while True:
+        end = text.find(sep, start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + len(sep)
+
+
+def _iter_regex_split(text: str, pattern: re.Pattern) -> Iterator[str]:
+    """按正则逐段切分文本（结果与 pattern.split 相同，但不一次性生成整个列表）"""
+    start = 0
+    for match in pattern.finditer(text):
+        yield text[start:match.start()]
+        start = match.end()
+    yield text[start:]
+
+
+def _classify_error(error_msg: str) -> Tuple[str, str]:
+    """根据错误信息判断错误类型，返回 (错误类型, 详细提示)"""
+    msg_lower = error_msg.lower()
+    for keywords, error_type, detailed_error in _ERROR_RULES:
+        if any(keyword in msg_lower for keyword in keywords):
+            return error_type, detailed_error
+    return "unknown", (
+        "大纲生成失败\n\n"
+        f"{error_msg}\n\n"
+        "请检查「系统设置」中的服务商配置。"
+    )
+
+
+def _decode_json_object(text: str, start: int) -> Any:
+    """
+    从 text[start] 处的左花括号开始解析一个 JSON 对象，忽略前后的其他文字
+
+    安装了 orjson 时先尝试把到最后一个右花括号为止的部分整体交给 orjson；
+    后面还有多余花括号等情况下再用标准库 raw_decode 逐个解析。
+
+    Raises:
+        ValueError: 无法解析出 JSON 对象
+    """
+    if orjson is not None:
+        end = text.rfind('}') + 1
+        try:
+            return orjson.loads(text[start:end])
+        except orjson.JSONDecodeError:
+            pass
+    return _JSON_DECODER.raw_decode(text, start)[0]
+
 
 class OutlineService:
     def __init__(self):
         logger.debug("初始化 OutlineService...")
         self.text_config = self._load_text_config()
-        self.client = self._get_client()
-        self.prompt_template = self._load_prompt_template()
+        # 只校验配置，客户端在第一次调用 API 时才创建
+        self._provider_config = provider_config = self._validate_config()
+
+        # 模型参数在初始化时读取一次（配置变更时服务实例会被重建）
+        self._model = provider_config.get('model', 'gemini-2.0-flash-exp')
+        self._temperature = provider_config.get('temperature', 1.0)
+        # 改写需要稍微严谨一点，但也需要创意
+        self._rewrite_temperature = provider_config.get('temperature', 0.8)
+        self._max_output_tokens = provider_config.get('max_output_tokens', 8000)
+
+        # 检查大纲模板是否存在（模板内容每次使用时读取，修改后无需重启即可生效）
+        self._load_prompt_template()
         logger.info(f"OutlineService 初始化完成，使用服务商: {self.text_config.get('active_provider')}")
 
     def _load_text_config(self) -> dict:
         """加载文本生成配置"""
-        config_path = Path(__file__).parent.parent.parent / 'text_providers.yaml'
+        config_path = _TEXT_CONFIG_PATH
         logger.debug(f"加载文本配置: {config_path}")
 
-        if config_path.exists():
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f) or {}
-                logger.debug(f"文本配置加载成功: active={config.get('active_provider')}")
-                return config
-            except yaml.YAMLError as e:
-                logger.error(f"文本配置 YAML 解析失败: {e}")
-                raise ValueError(
-                    f"文本配置文件格式错误: text_providers.yaml\n"
-                    f"YAML 解析错误: {e}\n"
-                    "解决方案：检查 YAML 缩进和语法"
-                )
+        try:
+            config = load_yaml(config_path) or {}
+            logger.debug(f"文本配置加载成功: active={config.get('active_provider')}")
+            return config
+        except FileNotFoundError:
+            pass
+        except yaml.YAMLError as e:
+            logger.error(f"文本配置 YAML 解析失败: {e}")
+            raise ValueError(
+                f"文本配置文件格式错误: text_providers.yaml\n"
+                f"YAML 解析错误: {e}\n"
+                "解决方案：检查 YAML 缩进和语法"
+            )
 
         logger.warning("text_providers.yaml 不存在，使用默认配置")
         # 默认配置
@@ -52,8 +192,8 @@ class OutlineService:
             }
         }
 
-    def _get_client(self):
-        """根据配置获取客户端"""
+    def _validate_config(self) -> dict:
+        """校验当前激活的服务商配置，返回服务商配置"""
         active_provider = self.text_config.get('active_provider', 'google_gemini')
         providers = self.text_config.get('providers', {})
 
@@ -85,63 +225,80 @@ class OutlineService:
             )
 
         logger.info(f"使用文本服务商: {active_provider} (type={provider_config.get('type')})")
-        return get_text_chat_client(provider_config)
+        return provider_config
+
+    @functools.cached_property
+    def client(self):
+        """文本生成客户端（首次访问时创建，之后复用）"""
+        return get_text_chat_client(self._provider_config)
 
     def _load_prompt_template(self) -> str:
-        prompt_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            "prompts",
-            "outline_prompt.txt"
-        )
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
+        return read_text(_PROMPTS_DIR / 'outline_prompt.txt')
+
+    @property
+    def prompt_template(self) -> str:
+        """大纲 Prompt 模板（按文件修改时间缓存，模板被修改后自动重新读取）"""
+        return self._load_prompt_template()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _split_topic_template(template: str) -> Optional[Tuple[str, str]]:
+        """
+        把只含一个 {topic} 占位符的模板预先拆成前后两段
+
+        Returns:
+            (前段, 后段)；模板中还有其他花括号时返回 None，仍使用 str.format
+        """
+        prefix, placeholder, suffix = template.partition('{topic}')
+        if not placeholder:
+            return None
+        for part in (prefix, suffix):
+            if '{' in part or '}' in part:
+                return None
+        return prefix, suffix
+
+    @property
+    def rewrite_prompt_template(self) -> str:
+        """改写模式的 Prompt 模板（按文件修改时间缓存，模板被修改后自动重新读取）"""
+        return self._load_rewrite_prompt_template()
 
     def _load_rewrite_prompt_template(self) -> str:
-        prompt_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            "prompts",
-            "outline_rewrite_prompt.txt"
-        )
-        if not os.path.exists(prompt_path):
+        try:
+            return read_text(_PROMPTS_DIR / 'outline_rewrite_prompt.txt')
+        except FileNotFoundError:
             # Fallback to default if rewrite prompt missing
             return self.prompt_template
-            
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
 
-    def _parse_outline(self, outline_text: str) -> List[Dict[str, Any]]:
+    def _iter_outline(self, outline_text: str) -> Iterator[Dict[str, Any]]:
+        """逐页解析大纲，按顺序生成页面字典"""
         # 按 <page> 分割页面（兼容旧的 --- 分隔符）
         if '<page>' in outline_text:
-            pages_raw = re.split(r'<page>', outline_text, flags=re.IGNORECASE)
+            if outline_text.count('<page>') == outline_text.lower().count('<page>'):
+                pages_raw = _iter_split(outline_text, '<page>')
+            else:
+                # 同时混有 <PAGE>、<Page> 等大小写变体时，使用忽略大小写的正则分割
+                pages_raw = _iter_regex_split(outline_text, _PAGE_SPLIT_RE)
         else:
             # 向后兼容：如果没有 <page> 则使用 ---
-            pages_raw = outline_text.split("---")
-
-        pages = []
+            pages_raw = _iter_split(outline_text, "---")
 
         for index, page_text in enumerate(pages_raw):
             page_text = page_text.strip()
             if not page_text:
                 continue
 
-            page_type = "content"
-            type_match = re.match(r"\[(\S+)\]", page_text)
-            if type_match:
-                type_cn = type_match.group(1)
-                type_mapping = {
-                    "封面": "cover",
-                    "内容": "content",
-                    "总结": "summary",
-                }
-                page_type = type_mapping.get(type_cn, "content")
+            # 未标注类型或类型未知时按内容页处理
+            type_match = _TYPE_RE.match(page_text)
+            page_type = (_TYPE_MAP.get(type_match.group(1)) if type_match else None) or "content"
 
-            pages.append({
+            yield {
                 "index": index,
                 "type": page_type,
                 "content": page_text
-            })
+            }
 
-        return pages
+    def _parse_outline(self, outline_text: str) -> List[Dict[str, Any]]:
+        return list(self._iter_outline(outline_text))
 
     def generate_outline(
         self,
@@ -149,34 +306,30 @@ class OutlineService:
         images: Optional[List[bytes]] = None
     ) -> Dict[str, Any]:
         try:
-            logger.info(f"开始生成大纲: topic={topic[:50]}..., images={len(images) if images else 0}")
-            prompt = self.prompt_template.format(topic=topic)
+            logger.info("开始生成大纲: topic=%.50s..., images=%d", topic, len(images) if images else 0)
+            prompt_template = self.prompt_template
+            prompt_parts = self._split_topic_template(prompt_template)
+            if prompt_parts is not None:
+                prompt = prompt_parts[0] + topic + prompt_parts[1]
+            else:
+                prompt = prompt_template.format_map({'topic': topic})
 
             if images and len(images) > 0:
                 prompt += f"\n\n注意：用户提供了 {len(images)} 张参考图片，请在生成大纲时考虑这些图片的内容和风格。这些图片可能是产品图、个人照片或场景图，请根据图片内容来优化大纲，使生成的内容与图片相关联。"
-                logger.debug(f"添加了 {len(images)} 张参考图片到提示词")
-
-            # 从配置中获取模型参数
-            active_provider = self.text_config.get('active_provider', 'google_gemini')
-            providers = self.text_config.get('providers', {})
-            provider_config = providers.get(active_provider, {})
-
-            model = provider_config.get('model', 'gemini-2.0-flash-exp')
-            temperature = provider_config.get('temperature', 1.0)
-            max_output_tokens = provider_config.get('max_output_tokens', 8000)
+                logger.debug("添加了 %d 张参考图片到提示词", len(images))
 
-            logger.info(f"调用文本生成 API: model={model}, temperature={temperature}")
+            logger.info("调用文本生成 API: model=%s, temperature=%s", self._model, self._temperature)
             outline_text = self.client.generate_text(
                 prompt=prompt,
-                model=model,
-                temperature=temperature,
-                max_output_tokens=max_output_tokens,
+                model=self._model,
+                temperature=self._temperature,
+                max_output_tokens=self._max_output_tokens,
                 images=images
             )
 
-            logger.debug(f"API 返回文本长度: {len(outline_text)} 字符")
+            logger.debug("API 返回文本长度: %d 字符", len(outline_text))
             pages = self._parse_outline(outline_text)
-            logger.info(f"大纲解析完成，共 {len(pages)} 页")
+            logger.info("大纲解析完成，共 %d 页", len(pages))
 
             return {
                 "success": True,
@@ -187,56 +340,10 @@ class OutlineService:
 
         except Exception as e:
             error_msg = str(e)
-            logger.error(f"大纲生成失败: {error_msg}")
+            logger.error("大纲生成失败: %s", error_msg)
 
             # 根据错误类型提供更详细的错误信息
-            error_type = "unknown"
-
-            if "未配置 API Key" in error_msg or "api_key" in error_msg.lower():
-                error_type = "missing_api_key"
-                detailed_error = (
-                    "请先配置 API Key\n\n"
-                    "请前往「系统设置」页面添加文本生成服务商配置，"
-                    "或手动编辑 text_providers.yaml 文件。"
-                )
-            elif "未找到任何文本生成服务商配置" in error_msg:
-                error_type = "no_provider"
-                detailed_error = (
-                    "未配置文本生成服务商\n\n"
-                    "请前往「系统设置」页面添加文本生成服务商，"
-                    "支持 OpenAI、Google Gemini 等多种服务商。"
-                )
-            elif "unauthorized" in error_msg.lower() or "401" in error_msg:
-                error_type = "auth_failed"
-                detailed_error = (
-                    "API 认证失败\n\n"
-                    "API Key 无效或已过期，请在「系统设置」中检查并更新。"
-                )
-            elif "model" in error_msg.lower() or "404" in error_msg:
-                error_type = "model_error"
-                detailed_error = (
-                    "模型访问失败\n\n"
-                    "模型名称可能不正确，请在「系统设置」中检查配置。"
-                )
-            elif "timeout" in error_msg.lower() or "连接" in error_msg:
-                error_type = "network_error"
-                detailed_error = (
-                    "网络连接失败\n\n"
-                    "请检查网络连接，或稍后重试。"
-                )
-            elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
-                error_type = "rate_limit"
-                detailed_error = (
-                    "API 配额限制\n\n"
-                    "API 调用次数超限，请等待配额重置或升级套餐。"
-                )
-            else:
-                error_type = "unknown"
-                detailed_error = (
-                    "大纲生成失败\n\n"
-                    f"{error_msg}\n\n"
-                    "请检查「系统设置」中的服务商配置。"
-                )
+            error_type, detailed_error = _classify_error(error_msg)
 
             return {
                 "success": False,
@@ -257,34 +364,27 @@ class OutlineService:
             images: 图片二进制列表（可选）
         """
         try:
-            logger.info(f"开始改写文章: title={article_data.get('title')}, images={len(images) if images else 0}")
+            logger.info("开始改写文章: title=%s, images=%d", article_data.get('title'), len(images) if images else 0)
             
-            # 加载改写 Prompt
-            rewrite_prompt = self._load_rewrite_prompt_template()
+            rewrite_prompt = self.rewrite_prompt_template
             
-            # 构建 Prompt (使用 replace 而不是 format，防止 JSON 中的花括号被错误解析)
-            prompt = rewrite_prompt.replace('{title}', article_data.get('title', '无标题'))
-            prompt = prompt.replace('{content}', article_data.get('text', '')[:3000])
-            prompt = prompt.replace('{image_count}', str(len(images) if images else 0))
-
-            # 从配置中获取模型参数
-            active_provider = self.text_config.get('active_provider', 'google_gemini')
-            providers = self.text_config.get('providers', {})
-            provider_config = providers.get(active_provider, {})
-
-            model = provider_config.get('model', 'gemini-2.0-flash-exp')
-            temperature = provider_config.get('temperature', 0.8) # 改写需要稍微严谨一点，但也需要创意
-            max_output_tokens = provider_config.get('max_output_tokens', 8000)
+            # 构建 Prompt (一次扫描替换所有占位符，不使用 format，防止 JSON 中的花括号被错误解析)
+            fields = {
+                'title': article_data.get('title', '无标题'),
+                'content': article_data.get('text', '')[:_ARTICLE_MAX_CHARS],
+                'image_count': str(len(images) if images else 0),
+            }
+            prompt = _REWRITE_PLACEHOLDER_RE.sub(lambda m: fields[m.group(1)], rewrite_prompt)
 
-            logger.info(f"调用改写 API: model={model}")
+            logger.info("调用改写 API: model=%s", self._model)
             
             # 这里的 images 主要是为了让模型知道有这些图，未必能直接读懂所有图（取决于模型能力）
             # 对于 Gemini Pro Vision，传入图片可以帮助它理解上下文
             outline_text = self.client.generate_text(
                 prompt=prompt,
-                model=model,
-                temperature=temperature,
-                max_output_tokens=max_output_tokens,
+                model=self._model,
+                temperature=self._rewrite_temperature,
+                max_output_tokens=self._max_output_tokens,
                 images=images
             )
             
@@ -294,18 +394,11 @@ class OutlineService:
             final_outline = outline_text
             
             try:
-                # 尝试找到 JSON 字符串
-                # 使用非贪婪匹配寻找最外层的花括号
-                json_match = re.search(r'\{[\s\S]*\}', outline_text)
-                if json_match:
-                    json_str = json_match.group(0)
-                    # 尝试清理一下常见的Markdown格式标记
-                    if json_str.startswith('```json'):
-                        json_str = json_str[7:]
-                    if json_str.endswith('```'):
-                        json_str = json_str[:-3]
-                    
-                    data = json.loads(json_str)
+                # 从第一个左花括号开始解析一个完整的 JSON 对象，
+                # 前面的 ```json 标记和后面多余的文字（如结尾的 ```）都会被忽略
+                json_start = outline_text.find('{')
+                if json_start != -1:
+                    data = _decode_json_object(outline_text, json_start)
                     if 'outline' in data:
                         final_outline = data['outline']
                     if 'pages' in data:
@@ -314,7 +407,7 @@ class OutlineService:
                         for i, p in enumerate(pages):
                             p['index'] = i
             except Exception as e:
-                logger.warning(f"解析改写结果 JSON 失败: {e}，尝试使用普通解析")
+                logger.warning("解析改写结果 JSON 失败: %s，尝试使用普通解析", e)
                 # 如果 JSON 解析失败，而且 outline_text 本身看起来不像 JSON，那就直接用 text
                 pages = self._parse_outline(outline_text)
 
@@ -322,7 +415,7 @@ class OutlineService:
             if not pages:
                 pages = self._parse_outline(outline_text)
 
-            logger.info(f"改写完成，共 {len(pages)} 页")
+            logger.info("改写完成，共 %d 页", len(pages))
 
             return {
                 "success": True,
@@ -333,7 +426,7 @@ class OutlineService:
             }
 
         except Exception as e:
-            logger.error(f"文章改写失败: {e}")
+            logger.error("文章改写失败: %s", e)
             return {
                 "success": False,
                 "error": f"文章改写失败: {str(e)}",
@@ -341,9 +434,45 @@ class OutlineService:
             }
 
 
+# (配置文件修改时间, 服务实例)，作为一个元组整体替换，无锁读取时不会读到不一致的组合
+_service_entry: Optional[Tuple[Optional[int], "OutlineService"]] = None
+_service_lock = threading.Lock()
+
+
+def _text_config_mtime() -> Optional[int]:
+    """获取 text_providers.yaml 的修改时间（文件不存在时返回 None）"""
+    try:
+        return os.stat(_TEXT_CONFIG_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
 def get_outline_service() -> OutlineService:
     """
-    获取大纲生成服务实例
-    每次调用都创建新实例以确保配置是最新的
+    获取全局大纲生成服务实例
+
+    不再每次调用都创建新实例：复用同一个实例（及其文本客户端的连接池），
+    text_providers.yaml 被修改或调用 invalidate_outline_service() 后才重建，
+    以确保配置是最新的；Prompt 模板每次使用时按修改时间重新检查，修改后立即生效
     """
-    return OutlineService()
+    global _service_entry
+    mtime = _text_config_mtime()
+    entry = _service_entry
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+
+    with _service_lock:
+        # 双重检查：等待锁期间其他线程可能已经完成重建
+        entry = _service_entry
+        if entry is None or entry[0] != mtime:
+            entry = (mtime, OutlineService())
+            _service_entry = entry
+        return entry[1]
+
+
+def invalidate_outline_service():
+    """丢弃全局服务实例和已缓存的配置，下次获取时按最新配置重建（配置更新后调用）"""
+    global _service_entry
+    with _service_lock:
+        file_cache.invalidate(_TEXT_CONFIG_PATH)
+        _service_entry = None
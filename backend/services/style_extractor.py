@@ -7,15 +7,88 @@
 import os
 import re
 import json
+import hashlib
+import functools
 import logging
 import yaml
-from pathlib import Path
-from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+from backend.utils.file_cache import load_yaml, read_text
 from backend.utils.text_client import get_text_chat_client
 from backend.services.brand import get_brand_service
 
+# orjson 优先用于解析 JSON（项目依赖；未安装时使用标准库）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# json_repair 用于修复模型输出中不规范的 JSON（项目依赖；未安装时跳过修复步骤）
+try:
+    from json_repair import loads as json_repair_loads
+except ImportError:
+    json_repair_loads = None
+
 logger = logging.getLogger(__name__)
 
+# 常用路径（模块加载时计算一次）
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_ROOT_DIR = os.path.dirname(_BACKEND_DIR)
+_PROMPTS_DIR = os.path.join(_BACKEND_DIR, 'prompts')
+_TEXT_CONFIG_PATH = os.path.join(_ROOT_DIR, 'text_providers.yaml')
+
+# JSON 响应解析用的正则（模块加载时编译一次）
+_CODE_BLOCK_RE = re.compile(r'```(?:json)?\s*\n?([\s\S]*?)\n?```')
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+# 文风分析时每篇内容样本正文的最大字符数（控制 Prompt 长度）
+_SAMPLE_MAX_CHARS = 2000
+# 判断内容样本是否重复时比较的正文前缀长度
+_DEDUPE_PREFIX_CHARS = 200
+
+# 推理模型可能在正文前输出思考过程
+_THINK_RE = re.compile(r'<think>.*?</think>', re.DOTALL)
+
+# 要求模型直接输出 JSON 对象（服务商不支持时由客户端去掉后重试）
+_JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+
+def _read_image_bytes(full_path: str) -> Optional[bytes]:
+    """读取图片文件（文件不存在时返回 None，其他错误记录警告后返回 None）"""
+    try:
+        with open(full_path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"读取图片失败: {full_path}, {e}")
+        return None
+
+
+def _dedupe_contents(contents: List[Dict], seen: set) -> List[Dict]:
+    """按正文前缀去除重复的内容样本（转发、模板开头等），正文为空的内容保留"""
+    unique = []
+    for content in contents:
+        text = (content.get('text') or '').strip()
+        if text:
+            key = hashlib.blake2b(
+                text[:_DEDUPE_PREFIX_CHARS].encode('utf-8'), digest_size=8
+            ).digest()
+            if key in seen:
+                continue
+            seen.add(key)
+        unique.append(content)
+    return unique
+
+
+def _json_loads(text: str) -> Any:
+    """解析 JSON：优先使用 orjson，orjson 拒绝时再交给标准库（两者都失败时抛出 json.JSONDecodeError）"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
 
 class StyleExtractorService:
     """风格DNA提取服务类"""
@@ -26,9 +99,11 @@ class StyleExtractorService:
         self.text_config = self._load_text_config()
         self._init_error = None
         self._init_error_type = None
+        self._provider_config = None
 
+        # 只校验配置，客户端和 Prompt 模板在第一次分析时才创建/读取
         try:
-            self.client = self._get_client()
+            self._provider_config = self._validate_config()
         except ValueError as e:
             # 保存初始化错误，在调用时返回
             self._init_error = str(e)
@@ -40,32 +115,26 @@ class StyleExtractorService:
                 self._init_error_type = "no_provider"
             else:
                 self._init_error_type = "config_error"
-            self.client = None
 
-        self.writing_prompt_template = self._load_prompt_template("style_analysis_writing.txt")
-        self.visual_prompt_template = self._load_prompt_template("style_analysis_visual.txt")
         logger.info(f"StyleExtractorService 初始化完成")
 
     def _load_text_config(self) -> dict:
         """加载文本生成配置"""
-        config_path = Path(__file__).parent.parent.parent / 'text_providers.yaml'
-
-        if config_path.exists():
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f) or {}
-                return config
-            except yaml.YAMLError as e:
-                logger.error(f"文本配置 YAML 解析失败: {e}")
-                raise ValueError(f"文本配置文件格式错误: {e}")
+        try:
+            return load_yaml(_TEXT_CONFIG_PATH) or {}
+        except FileNotFoundError:
+            pass
+        except yaml.YAMLError as e:
+            logger.error(f"文本配置 YAML 解析失败: {e}")
+            raise ValueError(f"文本配置文件格式错误: {e}")
 
         return {
             'active_provider': 'google_gemini',
             'providers': {}
         }
 
-    def _get_client(self):
-        """根据配置获取客户端"""
+    def _validate_config(self) -> dict:
+        """校验当前激活的服务商配置，返回服务商配置"""
         active_provider = self.text_config.get('active_provider', 'google_gemini')
         providers = self.text_config.get('providers', {})
 
@@ -80,19 +149,34 @@ class StyleExtractorService:
         if not provider_config.get('api_key'):
             raise ValueError(f"文本服务商 {active_provider} 未配置 API Key")
 
-        return get_text_chat_client(provider_config)
+        return provider_config
+
+    @functools.cached_property
+    def client(self):
+        """文本生成客户端（首次访问时创建，之后复用）"""
+        return get_text_chat_client(self._provider_config)
+
+    @functools.cached_property
+    def writing_prompt_template(self) -> str:
+        """文风分析 Prompt 模板"""
+        return self._load_prompt_template("style_analysis_writing.txt")
+
+    @functools.cached_property
+    def visual_prompt_template(self) -> str:
+        """视觉风格分析 Prompt 模板"""
+        return self._load_prompt_template("style_analysis_visual.txt")
+
+    @functools.cached_property
+    def combined_prompt_template(self) -> str:
+        """文风与视觉风格合并分析 Prompt 模板（不存在时分别分析）"""
+        return self._load_prompt_template("style_analysis_combined.txt")
 
     def _load_prompt_template(self, filename: str) -> str:
         """加载Prompt模板"""
-        prompt_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            "prompts",
-            filename
-        )
-        if not os.path.exists(prompt_path):
+        try:
+            return read_text(os.path.join(_PROMPTS_DIR, filename))
+        except FileNotFoundError:
             return ""
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
 
     def _get_model_params(self) -> Dict[str, Any]:
         """获取模型参数"""
@@ -112,20 +196,31 @@ class StyleExtractorService:
             return None
 
         # 清理常见的格式问题
+        if '<think>' in text:
+            text = _THINK_RE.sub('', text)
         cleaned_text = text.strip()
 
         # 尝试直接解析
         try:
-            return json.loads(cleaned_text)
+            return _json_loads(cleaned_text)
         except json.JSONDecodeError:
             pass
 
+        # 使用 json_repair 修复（未闭合的括号、单引号、代码块标记、前后多余文字等）
+        if json_repair_loads is not None:
+            try:
+                repaired = json_repair_loads(cleaned_text)
+                if isinstance(repaired, dict) and repaired:
+                    return repaired
+            except Exception:
+                pass
+
         # 尝试从markdown代码块中提取
-        json_match = re.search(r'```(?:json)?\s*\n?([\s\S]*?)\n?```', cleaned_text)
+        json_match = _CODE_BLOCK_RE.search(cleaned_text)
         if json_match:
             try:
                 json_content = json_match.group(1).strip()
-                return json.loads(json_content)
+                return _json_loads(json_content)
             except json.JSONDecodeError:
                 pass
 
@@ -135,24 +230,25 @@ class StyleExtractorService:
         if start != -1 and end != -1 and end > start:
             json_str = cleaned_text[start:end + 1]
             try:
-                return json.loads(json_str)
+                return _json_loads(json_str)
             except json.JSONDecodeError:
                 # 尝试修复常见的 JSON 格式问题
                 try:
                     # 移除可能的尾随逗号
-                    fixed_json = re.sub(r',(\s*[}\]])', r'\1', json_str)
-                    return json.loads(fixed_json)
+                    fixed_json = _TRAILING_COMMA_RE.sub(r'\1', json_str)
+                    return _json_loads(fixed_json)
                 except json.JSONDecodeError:
                     pass
 
         return None
 
-    def extract_style(self, brand_id: str) -> Dict:
+    def extract_style(self, brand_id: str, refresh: bool = False) -> Dict:
         """
         提取品牌风格DNA
 
         Args:
             brand_id: 品牌ID
+            refresh: 是否跳过已缓存的分析结果重新分析（用户重试时使用）
 
         Returns:
             提取结果
@@ -190,11 +286,24 @@ class StyleExtractorService:
                     "error": "请先添加内容样本（公司内容或竞品内容）"
                 }
 
-            # 分析文风
-            writing_style = self._analyze_writing_style(company_contents, competitor_contents)
+            content_samples = self._build_content_samples(company_contents, competitor_contents)
+            images = self._collect_images(company_contents, competitor_contents)
 
-            # 分析视觉风格（如果有图片）
-            visual_style = self._analyze_visual_style(brand_id, company_contents, competitor_contents)
+            # 既有文字样本又有图片时，优先用一次多模态调用同时分析文风和视觉风格
+            combined = None
+            if content_samples and images and self.combined_prompt_template:
+                combined = self._analyze_combined_style(content_samples, images, refresh)
+
+            if combined is not None:
+                writing_style, visual_style = combined
+            else:
+                # 文风和视觉风格（如果有图片）的分析互不依赖，同时发起两次 API 调用
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    writing_future = executor.submit(self._analyze_writing_style, content_samples, refresh)
+                    visual_future = executor.submit(self._analyze_visual_style, images, refresh)
+                    # 文风分析失败时抛出异常；视觉风格分析失败时返回 None
+                    writing_style = writing_future.result()
+                    visual_style = visual_future.result()
 
             # 生成综合风格Prompt
             style_prompt = self._generate_style_prompt(
@@ -248,29 +357,121 @@ class StyleExtractorService:
                 "error_type": error_type
             }
 
-    def _analyze_writing_style(
-        self,
+    @staticmethod
+    def _split_samples_prompt(template: str, content_samples: str) -> Tuple[str, Optional[str]]:
+        """
+        把模板拆成系统提示词和用户提示词
+
+        {content_samples} 位于模板末尾时，前面的分析要求作为固定不变的系统提示词，
+        只把内容样本作为用户提示词，便于服务商缓存相同的提示词前缀。
+
+        Returns:
+            (用户提示词, 系统提示词)；占位符后还有其他内容时整体作为用户提示词
+        """
+        head, placeholder, tail = template.partition("{content_samples}")
+        if placeholder and not tail.strip():
+            return content_samples, head.rstrip()
+        return template.replace("{content_samples}", content_samples), None
+
+    @staticmethod
+    def _build_content_samples(
         company_contents: List[Dict],
         competitor_contents: List[Dict]
-    ) -> Optional[Dict]:
-        """分析文风"""
-        if not self.writing_prompt_template:
+    ) -> Optional[str]:
+        """拼接文字内容样本：去重后最多5个公司内容、3个竞品，正文截断到 _SAMPLE_MAX_CHARS"""
+        seen = set()
+        company_contents = _dedupe_contents(company_contents, seen)
+        competitor_contents = _dedupe_contents(competitor_contents, seen)
+
+        labeled_contents = [("公司内容", content) for content in company_contents[:5]]
+        labeled_contents += [("竞品参考", content) for content in competitor_contents[:3]]
+
+        if not labeled_contents:
             return None
 
-        # 准备内容样本
-        samples = []
+        return "\n\n---\n\n".join(
+            f"【{label}】\n标题: {content.get('title', '')}\n正文: {(content.get('text') or '')[:_SAMPLE_MAX_CHARS]}"
+            for label, content in labeled_contents
+        )
+
+    @staticmethod
+    def _collect_images(
+        company_contents: List[Dict],
+        competitor_contents: List[Dict]
+    ) -> List[bytes]:
+        """收集并读取图片样本"""
+        image_paths = []
+
+        # 收集公司内容图片
+        for content in company_contents[:3]:
+            for img_path in content.get('images', [])[:2]:  # 每个内容最多2张
+                image_paths.append(os.path.join(_ROOT_DIR, img_path))
+
+        # 收集竞品图片
+        for content in competitor_contents[:2]:
+            for img_path in content.get('images', [])[:1]:  # 每个竞品最多1张
+                image_paths.append(os.path.join(_ROOT_DIR, img_path))
+
+        if not image_paths:
+            return []
 
-        for content in company_contents[:5]:  # 最多5个
-            samples.append(f"【公司内容】\n标题: {content.get('title', '')}\n正文: {content.get('text', '')}")
+        # 并行读取图片（map 保持原有顺序）
+        with ThreadPoolExecutor(max_workers=len(image_paths)) as executor:
+            return [data for data in executor.map(_read_image_bytes, image_paths) if data is not None]
 
-        for content in competitor_contents[:3]:  # 最多3个竞品
-            samples.append(f"【竞品参考】\n标题: {content.get('title', '')}\n正文: {content.get('text', '')}")
+    def _analyze_combined_style(
+        self,
+        content_samples: str,
+        images: List[bytes],
+        refresh: bool = False
+    ) -> Optional[Tuple[Dict, Dict]]:
+        """
+        一次调用同时分析文风和视觉风格
 
-        if not samples:
+        Returns:
+            (文风, 视觉风格)；调用失败或返回结果无法解析时返回 None，由调用方改为分别分析
+        """
+        prompt, system_prompt = self._split_samples_prompt(
+            self.combined_prompt_template, content_samples
+        )
+
+        try:
+            params = self._get_model_params()
+            response = self.client.generate_text(
+                prompt=prompt,
+                model=params['model'],
+                temperature=0.5,  # 使用较低温度以获得更稳定的结果
+                max_output_tokens=params['max_output_tokens'],
+                system_prompt=system_prompt,
+                images=images,
+                response_format=_JSON_RESPONSE_FORMAT,
+                cache=True,
+                refresh_cache=refresh
+            )
+        except Exception as e:
+            # 例如纯文本模型不支持图片输入：改为分别分析，文风分析仍可成功
+            logger.warning(f"合并风格分析失败，改为分别分析: {e}")
             return None
 
-        content_samples = "\n\n---\n\n".join(samples)
-        prompt = self.writing_prompt_template.replace("{content_samples}", content_samples)
+        result = self._parse_json_response(response)
+        if (
+            isinstance(result, dict)
+            and isinstance(result.get("writing_style"), dict)
+            and isinstance(result.get("visual_style"), dict)
+        ):
+            return result["writing_style"], result["visual_style"]
+
+        logger.warning(f"无法解析合并风格分析结果，改为分别分析，原始响应: {(response or '')[:500]}")
+        return None
+
+    def _analyze_writing_style(self, content_samples: Optional[str], refresh: bool = False) -> Optional[Dict]:
+        """分析文风"""
+        if not self.writing_prompt_template or not content_samples:
+            return None
+
+        prompt, system_prompt = self._split_samples_prompt(
+            self.writing_prompt_template, content_samples
+        )
 
         try:
             params = self._get_model_params()
@@ -278,7 +479,11 @@ class StyleExtractorService:
                 prompt=prompt,
                 model=params['model'],
                 temperature=0.5,  # 使用较低温度以获得更稳定的结果
-                max_output_tokens=params['max_output_tokens']
+                max_output_tokens=params['max_output_tokens'],
+                system_prompt=system_prompt,
+                response_format=_JSON_RESPONSE_FORMAT,
+                cache=True,
+                refresh_cache=refresh
             )
 
             writing_style = self._parse_json_response(response)
@@ -298,44 +503,11 @@ class StyleExtractorService:
             # 抛出异常而不是返回 None，让上层处理
             raise
 
-    def _analyze_visual_style(
-        self,
-        brand_id: str,
-        company_contents: List[Dict],
-        competitor_contents: List[Dict]
-    ) -> Optional[Dict]:
+    def _analyze_visual_style(self, images: List[bytes], refresh: bool = False) -> Optional[Dict]:
         """分析视觉风格"""
         if not self.visual_prompt_template:
             return None
 
-        # 收集图片
-        brand_service = get_brand_service()
-        root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-
-        images = []
-
-        # 收集公司内容图片
-        for content in company_contents[:3]:
-            for img_path in content.get('images', [])[:2]:  # 每个内容最多2张
-                full_path = os.path.join(root_dir, img_path)
-                if os.path.exists(full_path):
-                    try:
-                        with open(full_path, 'rb') as f:
-                            images.append(f.read())
-                    except Exception as e:
-                        logger.warning(f"读取图片失败: {img_path}, {e}")
-
-        # 收集竞品图片
-        for content in competitor_contents[:2]:
-            for img_path in content.get('images', [])[:1]:  # 每个竞品最多1张
-                full_path = os.path.join(root_dir, img_path)
-                if os.path.exists(full_path):
-                    try:
-                        with open(full_path, 'rb') as f:
-                            images.append(f.read())
-                    except Exception as e:
-                        logger.warning(f"读取图片失败: {img_path}, {e}")
-
         if not images:
             return {
                 "summary": "无图片样本，无法分析视觉风格",
@@ -349,7 +521,10 @@ class StyleExtractorService:
                 model=params['model'],
                 temperature=0.5,
                 max_output_tokens=params['max_output_tokens'],
-                images=images
+                images=images,
+                response_format=_JSON_RESPONSE_FORMAT,
+                cache=True,
+                refresh_cache=refresh
             )
 
             visual_style = self._parse_json_response(response)
@@ -0,0 +1,84 @@
+"""配置文件与模板文件缓存（按文件修改时间、大小和 inode 失效）"""
+import copy
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple, Union
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# 优先使用 libyaml 提供的 C 解析器，解析结果与 SafeLoader 一致
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+    logger.warning("PyYAML 未启用 libyaml，使用纯 Python 解析器（较慢），可安装带 libyaml 支持的 PyYAML")
+
+# 文件签名：(修改时间, 大小, inode)
+# 只比较修改时间时，mtime 精度较粗的文件系统上同一时刻内的两次保存无法区分
+_Signature = Tuple[int, int, int]
+
+# 路径 -> (文件签名, 解析结果)
+_YAML_CACHE: Dict[str, Tuple[_Signature, Any]] = {}
+_TEXT_CACHE: Dict[str, Tuple[_Signature, str]] = {}
+
+
+def _signature(path: str) -> _Signature:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def invalidate(path: Optional[Union[str, os.PathLike]] = None):
+    """
+    丢弃缓存，下次读取时重新解析（配置通过接口保存后调用）
+
+    Args:
+        path: 要丢弃的文件路径；为 None 时清空全部缓存
+    """
+    if path is None:
+        _YAML_CACHE.clear()
+        _TEXT_CACHE.clear()
+        return
+    key = os.fspath(path)
+    _YAML_CACHE.pop(key, None)
+    _TEXT_CACHE.pop(key, None)
+
+
+def load_yaml(path: Union[str, os.PathLike]) -> Any:
+    """
+    读取并解析 YAML 文件
+
+    文件未被修改时直接使用缓存的解析结果，只需一次 stat；
+    返回的是缓存的深拷贝，调用方可以随意修改。
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        yaml.YAMLError: YAML 格式错误
+    """
+    key = os.fspath(path)
+    signature = _signature(key)
+    cached = _YAML_CACHE.get(key)
+    if cached is None or cached[0] != signature:
+        # 以二进制读取，由 libyaml 直接解码 UTF-8
+        with open(key, 'rb') as f:
+            cached = (signature, yaml.load(f.read(), Loader=_SafeLoader))
+        _YAML_CACHE[key] = cached
+    return copy.deepcopy(cached[1])
+
+
+def read_text(path: Union[str, os.PathLike]) -> str:
+    """
+    读取文本文件（如 Prompt 模板），文件未被修改时直接使用缓存内容
+
+    Raises:
+        FileNotFoundError: 文件不存在
+    """
+    key = os.fspath(path)
+    signature = _signature(key)
+    cached = _TEXT_CACHE.get(key)
+    if cached is None or cached[0] != signature:
+        with open(key, 'r', encoding='utf-8') as f:
+            cached = (signature, f.read())
+        _TEXT_CACHE[key] = cached
+    return cached[1]
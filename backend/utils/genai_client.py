@@ -107,6 +107,7 @@ class GenAIClient:
         use_thinking: bool = False,
         images: list = None,
         system_prompt: str = None,
+        response_format: dict = None,
         **kwargs
     ) -> str:
         """
@@ -120,7 +121,8 @@ class GenAIClient:
             use_search: 是否使用搜索
             use_thinking: 是否启用思考模式
             images: 图片列表（暂不支持）
-            system_prompt: 系统提示词（暂不支持）
+            system_prompt: 系统提示词（可选）
+            response_format: 输出格式（可选），{"type": "json_object"} 时要求输出 JSON
 
         Returns:
             生成的文本
@@ -151,6 +153,14 @@ class GenAIClient:
             "safety_settings": self.default_safety_settings,
         }
 
+        # 添加系统提示词
+        if system_prompt:
+            config_kwargs["system_instruction"] = system_prompt
+
+        # 要求输出 JSON
+        if response_format and response_format.get("type") == "json_object":
+            config_kwargs["response_mime_type"] = "application/json"
+
         # 添加搜索工具
         if use_search:
             config_kwargs["tools"] = [types.Tool(google_search=types.GoogleSearch())]
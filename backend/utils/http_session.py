@@ -0,0 +1,13 @@
+"""带连接池的 HTTP 会话（图片生成器和文本客户端共用的创建方式）"""
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def create_http_session() -> requests.Session:
+    """创建带连接池的 HTTP 会话"""
+    session = requests.Session()
+    # 连接池上限需不小于 ImageService.MAX_CONCURRENT，否则并发生成时连接会被丢弃重建
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
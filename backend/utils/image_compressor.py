@@ -9,7 +9,8 @@ def compress_image(
     max_size_kb: int = 200,  # 默认200KB
     quality_start: int = 85,
     quality_min: int = 20,
-    max_dimension: int = 2048
+    max_dimension: int = 2048,
+    resample: Image.Resampling = Image.Resampling.LANCZOS
 ) -> bytes:
     """
     压缩图片到指定大小以内
@@ -20,6 +21,7 @@ def compress_image(
         quality_start: 起始压缩质量（1-100）
         quality_min: 最低压缩质量（1-100）
         max_dimension: 最大边长（像素）
+        resample: 缩放算法（缩略图等小尺寸目标可用 BILINEAR，速度更快）
 
     Returns:
         压缩后的图片数据
@@ -50,7 +52,7 @@ def compress_image(
             ratio = min(max_dimension / width, max_dimension / height)
             new_width = int(width * ratio)
             new_height = int(height * ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            img = img.resize((new_width, new_height), resample)
 
         # 逐步降低质量直到满足大小要求
         quality = quality_start
@@ -72,7 +74,7 @@ def compress_image(
             while len(compressed_data) > max_size_bytes and max(width, height) > 512:
                 width = int(width * 0.9)
                 height = int(height * 0.9)
-                img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
+                img_resized = img.resize((width, height), resample)
 
                 output = io.BytesIO()
                 img_resized.save(output, format='JPEG', quality=quality_min, optimize=True)
@@ -1,12 +1,165 @@
 """Text API 客户端封装"""
+import os
 import time
+import json
+import logging
 import random
+import re
 import base64
+import hashlib
+import sqlite3
+import threading
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from typing import List, Optional, Union
+from .http_session import create_http_session
 from .image_compressor import compress_image
 
+logger = logging.getLogger(__name__)
+
+# API Key 基本格式：至少 10 个可打印 ASCII 字符，不含空白
+_API_KEY_RE = re.compile(r'[\x21-\x7e]{10,}')
+
+# orjson 用于加速请求体编码和响应解析（项目依赖；未安装时使用标准库）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _encode_json(payload: dict) -> bytes:
+    """把请求体编码为 JSON 字节串"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, allow_nan=False).encode('utf-8')
+
+
+def _decode_json(response: requests.Response):
+    """解析 JSON 响应（orjson 只接受 UTF-8，解析失败时交给 requests 按响应编码处理）"""
+    if orjson is not None:
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            pass
+    return response.json()
+
+
+# 所有 TextChatClient 共享的 HTTP 会话，复用 keep-alive 连接，避免每次请求重新建立 TCP/TLS 连接
+_SESSION = create_http_session()
+
+
+class _ResponseCache:
+    """
+    文本生成结果缓存
+
+    内存中保留最近的结果（LRU）；设置了数据库路径时同时写入 SQLite，
+    进程重启后仍然可以命中。缓存条目超过 TTL 后失效。
+    只有调用方显式传入 cache=True 的请求才会使用缓存。
+    """
+
+    MAX_ENTRIES = 128
+    TTL_SECONDS = 24 * 3600
+    # 温度高于该值的请求期望每次得到不同结果，不使用缓存
+    MAX_TEMPERATURE = 0.8
+
+    def __init__(self, db_path: Optional[str] = None):
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_path = db_path
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                with self._connect() as conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS responses ("
+                        "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"文本结果缓存数据库不可用，仅使用内存缓存: {e}")
+                self._db_path = None
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._db_path, timeout=5)
+
+    @staticmethod
+    def make_key(endpoint: str, model: str, temperature: float, max_output_tokens: int,
+                 prompt: str, system_prompt: Optional[str], images: Optional[list],
+                 response_format: Optional[dict] = None) -> str:
+        """根据请求内容生成缓存键（图片按内容哈希）"""
+        image_keys = []
+        for img in images or []:
+            if isinstance(img, bytes):
+                image_keys.append(hashlib.sha256(img).hexdigest())
+            else:
+                image_keys.append(str(img))
+        raw = json.dumps({
+            "e": endpoint, "m": model, "t": temperature, "n": max_output_tokens,
+            "p": prompt, "s": system_prompt, "i": image_keys, "f": response_format
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.TTL_SECONDS:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        if not self._db_path:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or now - row[1] >= self.TTL_SECONDS:
+            return None
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        self._remember(key, response, now)
+        if not self._db_path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, response, now)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"写入文本结果缓存失败: {e}")
+
+    def _remember(self, key: str, response: str, created_at: float):
+        with self._lock:
+            self._entries[key] = (created_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+
+# 设置 TEXT_RESPONSE_CACHE_DB 环境变量（SQLite 文件路径）后启用持久化缓存
+_response_cache = _ResponseCache(os.environ.get('TEXT_RESPONSE_CACHE_DB'))
+
+
+def _read_error_body(response: requests.Response, limit: int = 4096) -> str:
+    """只读取错误响应的前 limit 字节用于错误提示，不下载完整的错误页面"""
+    try:
+        data = response.raw.read(limit, decode_content=True) or b""
+    except Exception:
+        data = b""
+    finally:
+        response.close()
+    return data.decode(response.encoding or "utf-8", errors="replace")
+
 
 def retry_on_429(max_retries=3, base_delay=2):
     """429 错误自动重试装饰器"""
@@ -41,13 +194,24 @@ class TextChatClient:
     """Text API 客户端封装类"""
 
     def __init__(self, api_key: str = None, base_url: str = None, endpoint_type: str = None):
-        self.api_key = api_key
+        self.api_key = (api_key or '').strip()
         if not self.api_key:
             raise ValueError(
                 "Text API Key 未配置。\n"
                 "解决方案：在系统设置页面编辑文本生成服务商，填写 API Key"
             )
 
+        # 明显不合法的 API Key 直接报错，不必等到请求失败；
+        # 自定义 Base URL 的服务（如自建服务）可能接受任意格式的 Token，只记录警告
+        if not _API_KEY_RE.fullmatch(self.api_key):
+            if base_url:
+                logger.warning("Text API Key 格式异常（过短或包含空白/非 ASCII 字符），请确认是否正确")
+            else:
+                raise ValueError(
+                    "Text API Key 格式不正确（过短或包含空白/非 ASCII 字符）。\n"
+                    "解决方案：在系统设置页面检查 API Key 是否完整复制"
+                )
+
         self.base_url = (base_url or "https://api.openai.com").rstrip('/').rstrip('/v1')
 
         # 支持自定义端点路径
@@ -57,10 +221,6 @@ class TextChatClient:
             endpoint = '/' + endpoint
         self.chat_endpoint = f"{self.base_url}{endpoint}"
 
-    def _encode_image_to_base64(self, image_data: bytes) -> str:
-        """将图片数据编码为 base64"""
-        return base64.b64encode(image_data).decode('utf-8')
-
     def _build_content_with_images(
         self,
         text: str,
@@ -79,27 +239,30 @@ class TextChatClient:
         if not images:
             return text
 
-        content = [{"type": "text", "text": text}]
-
-        for img in images:
+        def to_image_url(img: Union[bytes, str]) -> str:
             if isinstance(img, bytes):
                 # 压缩图片到 200KB 以内
                 compressed_img = compress_image(img, max_size_kb=200)
-                # 图片数据，转为 base64 data URL
-                base64_data = self._encode_image_to_base64(compressed_img)
-                image_url = f"data:image/png;base64,{base64_data}"
-            else:
-                # 已经是 URL
-                image_url = img
-
-            content.append({
-                "type": "image_url",
-                "image_url": {"url": image_url}
-            })
+                # 图片数据，转为 base64 data URL（base64 只含 ASCII 字符）
+                return f"data:image/png;base64,{base64.b64encode(compressed_img).decode('ascii')}"
+            # 已经是 URL
+            return img
+
+        # 多张图片时并行压缩（Pillow 编码时会释放 GIL），map 保持原有顺序
+        bytes_count = sum(1 for img in images if isinstance(img, bytes))
+        if bytes_count > 1:
+            with ThreadPoolExecutor(max_workers=min(8, bytes_count)) as executor:
+                image_urls = list(executor.map(to_image_url, images))
+        else:
+            image_urls = [to_image_url(img) for img in images]
 
+        content = [{"type": "text", "text": text}]
+        content.extend(
+            {"type": "image_url", "image_url": {"url": image_url}}
+            for image_url in image_urls
+        )
         return content
 
-    @retry_on_429(max_retries=3, base_delay=2)
     def generate_text(
         self,
         prompt: str,
@@ -108,6 +271,9 @@ class TextChatClient:
         max_output_tokens: int = 8000,
         images: List[Union[bytes, str]] = None,
         system_prompt: str = None,
+        response_format: Optional[dict] = None,
+        cache: bool = False,
+        refresh_cache: bool = False,
         **kwargs
     ) -> str:
         """
@@ -120,10 +286,26 @@ class TextChatClient:
             max_output_tokens: 最大输出 token
             images: 图片列表（可选）
             system_prompt: 系统提示词（可选）
+            response_format: 输出格式（可选），如 {"type": "json_object"}，
+                仅 /chat/completions 端点使用，服务商不支持时自动去掉后重试
+            cache: 是否缓存结果（温度不高于 0.8 时生效，空结果不缓存）
+            refresh_cache: 跳过缓存查询重新请求，结果仍会写入缓存（用于用户重试）
 
         Returns:
             生成的文本
         """
+        # 调用方要求缓存时，相同请求（温度不高于 0.8）直接返回缓存结果
+        cache_key = None
+        if cache and temperature <= _ResponseCache.MAX_TEMPERATURE:
+            cache_key = _ResponseCache.make_key(
+                self.chat_endpoint, model, temperature, max_output_tokens,
+                prompt, system_prompt, images, response_format
+            )
+            if not refresh_cache:
+                cached = _response_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
         messages = []
 
         # 添加系统提示词
@@ -153,34 +335,76 @@ class TextChatClient:
         else:
             payload["messages"] = messages
             payload["max_tokens"] = max_output_tokens
+            if response_format:
+                payload["response_format"] = response_format
+
+        text = self._request_text(payload, model)
+        if cache_key is not None and text and text.strip():
+            _response_cache.put(cache_key, text)
+        return text
 
+    @retry_on_429(max_retries=3, base_delay=2)
+    def _request_text(self, payload: dict, model: str) -> str:
+        """
+        发送请求并提取生成的文本（遇到限流时自动重试）
+
+        请求体在 generate_text 中只构建一次，重试时不会重新压缩和编码图片。
+
+        Args:
+            payload: 请求体
+            model: 模型名称（用于错误提示）
+
+        Returns:
+            生成的文本
+        """
         headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
 
-        response = requests.post(
+        # 流式接收响应：出错时只读取响应开头的一部分
+        response = _SESSION.post(
             self.chat_endpoint,
-            json=payload,
+            data=_encode_json(payload),
             headers=headers,
-            timeout=300  # 5分钟超时
+            timeout=300,  # 5分钟超时
+            stream=True
         )
 
-        # 处理 max_tokens 参数错误 (部分新模型如 o1/o3 要求使用 max_completion_tokens)
-        if response.status_code == 400 and "max_token" in response.text:
-            print(f"[警告] 模型 {model} 不支持 max_tokens 参数，尝试使用 max_completion_tokens 重试...")
-            if "max_tokens" in payload:
-                payload["max_completion_tokens"] = payload.pop("max_tokens")
-                response = requests.post(
+        error_detail = None
+
+        if response.status_code == 400:
+            error_detail = _read_error_body(response)
+            should_retry = False
+
+            # 部分服务商不支持 response_format，去掉后按普通文本输出重试
+            if "response_format" in error_detail and "response_format" in payload:
+                logger.warning(f"模型 {model} 不支持 response_format 参数，去掉该参数重试...")
+                payload.pop("response_format")
+                should_retry = True
+
+            # 处理 max_tokens 参数错误 (部分新模型如 o1/o3 要求使用 max_completion_tokens)
+            if "max_token" in error_detail:
+                print(f"[警告] 模型 {model} 不支持 max_tokens 参数，尝试使用 max_completion_tokens 重试...")
+                if "max_tokens" in payload:
+                    payload["max_completion_tokens"] = payload.pop("max_tokens")
+                    should_retry = True
+
+            if should_retry:
+                response = _SESSION.post(
                     self.chat_endpoint,
-                    json=payload,
+                    data=_encode_json(payload),
                     headers=headers,
-                    timeout=300
+                    timeout=300,
+                    stream=True
                 )
+                error_detail = None
 
         if response.status_code != 200:
-            error_detail = response.text[:500]
+            if error_detail is None:
+                error_detail = _read_error_body(response)
+            error_detail = error_detail[:500]
             status_code = response.status_code
 
             # 根据状态码给出更详细的错误信息
@@ -251,7 +475,7 @@ class TextChatClient:
                 )
 
         try:
-            result = response.json()
+            result = _decode_json(response)
         except Exception as e:
             # API 返回非 JSON 格式
             raise Exception(
@@ -264,10 +488,11 @@ class TextChatClient:
                 "【建议】稍后重试，或检查 API 服务状态"
             )
 
-        # 调试：打印响应结构（可在生产环境移除）
-        print(f"[DEBUG] API Response keys: {list(result.keys())}")
-        if "output" in result:
-            print(f"[DEBUG] Output structure: {str(result['output'])[:500]}")
+        # 调试：记录响应结构（仅在开启 DEBUG 日志时才格式化）
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("API Response keys: %s", list(result.keys()))
+            if "output" in result:
+                logger.debug("Output structure: %s", str(result['output'])[:500])
 
         # 提取生成的文本
         if "choices" in result and len(result["choices"]) > 0:
@@ -517,7 +517,7 @@ export async function getStyleDna(brandId: string): Promise<{
 /**
  * 提取风格DNA
  */
-export async function extractStyle(brandId: string): Promise<{
+export async function extractStyle(brandId: string, refresh = false): Promise<{
   success: boolean
   style_dna?: {
     writing_style: WritingStyle | null
@@ -530,7 +530,7 @@ export async function extractStyle(brandId: string): Promise<{
   try {
     const response = await axios.post(
       `${API_BASE_URL}/brands/${brandId}/extract-style`,
-      {},
+      { refresh },
       { timeout: 120000 }  // 2分钟超时，因为需要AI分析
     )
     return response.data
@@ -481,12 +481,18 @@ export const useBrandStore = defineStore('brand', {
         return false
       }
 
+      // 上次提取失败或结果未能解析时，重试需要跳过后端缓存的分析结果
+      const styleDna = this.currentBrand.style_dna
+      const refresh = this.error !== null ||
+        !!styleDna?.writing_style?.parse_failed ||
+        !!styleDna?.visual_style?.parse_failed
+
       this.extracting = true
       this.error = null
       this.errorType = null
 
       try {
-        const result = await extractStyle(this.currentBrand.id)
+        const result = await extractStyle(this.currentBrand.id, refresh)
         if (result.success && result.style_dna) {
           // 更新风格DNA
           if (this.currentBrand) {
@@ -1,7 +1,26 @@
 
 from PIL import Image, ImageDraw, ImageFont
+import functools
 import os
 
+# MacOS usually has Arial or Helvetica
+FONT_CANDIDATES = (
+    "/System/Library/Fonts/Supplemental/Arial Bold.ttf",
+    "/System/Library/Fonts/Helvetica.ttc",
+    # Try a different common path
+    "/Library/Fonts/Arial.ttf",
+)
+
+@functools.lru_cache(maxsize=4)
+def _load_font(size):
+    """Load the first available font once per size, fallback to default"""
+    try:
+        font_path = next((p for p in FONT_CANDIDATES if os.path.exists(p)), FONT_CANDIDATES[-1])
+        return ImageFont.truetype(font_path, size)
+    except Exception as e:
+        print(f"Could not load custom font: {e}, using default")
+        return ImageFont.load_default()
+
 def create_logo(text="Redit.io", output_path="reddit_io_logo_gen.png"):
     # Image size - wide enough for text
     width = 400
@@ -12,19 +31,7 @@ def create_logo(text="Redit.io", output_path="reddit_io_logo_gen.png"):
     draw = ImageDraw.Draw(image)
     
     # Try to load a nice font, fallback to default
-    try:
-        # MacOS usually has Arial or Helvetica
-        font_path = "/System/Library/Fonts/Supplemental/Arial Bold.ttf"
-        if not os.path.exists(font_path):
-             font_path = "/System/Library/Fonts/Helvetica.ttc"
-        if not os.path.exists(font_path):
-             # Try a different common path
-             font_path = "/Library/Fonts/Arial.ttf"
-             
-        font = ImageFont.truetype(font_path, 60)
-    except Exception as e:
-        print(f"Could not load custom font: {e}, using default")
-        font = ImageFont.load_default()
+    font = _load_font(60)
         
     # Text color: Red #FF4D4F (RedInk primary color-ish)
     text_color = (255, 77, 79, 255) 
@@ -0,0 +1,45 @@
+"""
+配置文件缓存测试
+"""
+import os
+
+from backend.utils import file_cache
+
+
+def _write(path, content, mtime_ns):
+    path.write_text(content, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_load_yaml_returns_copy(tmp_path):
+    path = tmp_path / "config.yaml"
+    _write(path, "providers:\n  a: 1\n", 1_000_000_000)
+
+    first = file_cache.load_yaml(path)
+    first["providers"]["a"] = 2
+    assert file_cache.load_yaml(path) == {"providers": {"a": 1}}
+
+
+def test_same_mtime_different_size_is_reloaded(tmp_path):
+    """mtime 精度较粗时两次保存的修改时间相同，仍能读取到新内容"""
+    path = tmp_path / "config.yaml"
+    _write(path, "active_provider: a\n", 1_000_000_000)
+    assert file_cache.load_yaml(path)["active_provider"] == "a"
+
+    _write(path, "active_provider: bbb\n", 1_000_000_000)
+    assert file_cache.load_yaml(path)["active_provider"] == "bbb"
+
+
+def test_invalidate_forces_reload(tmp_path):
+    """内容长度和修改时间都不变的保存，调用 invalidate 后也能读取到新内容"""
+    path = tmp_path / "prompt.txt"
+    _write(path, "old", 1_000_000_000)
+    assert file_cache.read_text(path) == "old"
+
+    _write(path, "new", 1_000_000_000)
+    file_cache.invalidate(path)
+    assert file_cache.read_text(path) == "new"
+
+    _write(path, "abc", 1_000_000_000)
+    file_cache.invalidate()
+    assert file_cache.read_text(path) == "abc"
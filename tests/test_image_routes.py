@@ -0,0 +1,48 @@
+"""
+图片获取接口测试
+"""
+import io
+
+import pytest
+from PIL import Image
+
+from backend.services import image as image_module
+
+
+@pytest.fixture
+def history_root(tmp_path, monkeypatch):
+    """把历史记录目录指向临时目录，并在其中放一张图片和一个历史目录外的文件"""
+    root = tmp_path / "history"
+    (root / "task_1").mkdir(parents=True)
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "red").save(buffer, "PNG")
+    (root / "task_1" / "0.png").write_bytes(buffer.getvalue())
+    (tmp_path / "secret.png").write_bytes(b"not in history")
+    monkeypatch.setattr(image_module, "_HISTORY_ROOT", root)
+    return root
+
+
+def test_get_image_returns_thumbnail(client, history_root):
+    response = client.get('/api/images/task_1/0.png')
+    assert response.status_code == 200
+    assert (history_root / "task_1" / "thumb_0.png").exists()
+
+
+@pytest.mark.parametrize("url", [
+    '/api/images/../secret.png',
+    '/api/images/..%2F../secret.png',
+    '/api/images/task_1/..%5Csecret.png',
+    '/api/images/task_1/0.txt',
+])
+def test_get_image_rejects_paths_outside_history(client, history_root, url):
+    response = client.get(url)
+    assert response.status_code == 404
+    assert not (history_root.parent / "thumb_secret.png").exists()
+
+
+def test_resolve_image_path(history_root):
+    assert image_module.resolve_image_path("task_1", "0.png") == (history_root / "task_1" / "0.png").resolve()
+    assert image_module.resolve_image_path("..", "secret.png") is None
+    assert image_module.resolve_image_path("task_1", "a/b.png") is None
+    assert image_module.resolve_image_path("task_1", "notes.yaml") is None
+    assert image_module.get_thumbnail("..", "secret.png") is None
@@ -0,0 +1,156 @@
+"""
+图片生成服务测试（不调用图片服务商）
+"""
+import pytest
+
+from backend.services.image import ImageService, _compile_template
+
+
+def test_page_states_keyed_by_index():
+    """负数或很大的页码只影响自己的状态，不会覆盖其他页或撑大状态表"""
+    service = ImageService.__new__(ImageService)
+    task_state = {"page_states": {}}
+
+    service._mark_done(task_state, 0, "0.png")
+    service._mark_failed(task_state, -1, "bad index")
+    service._mark_failed(task_state, 10 ** 9, "huge index")
+
+    assert task_state["page_states"][0].status == "done"
+    assert task_state["page_states"][0].filename == "0.png"
+    assert len(task_state["page_states"]) == 3
+
+
+def _make_service(tmp_path, provider_config=None):
+    """构造不连接图片服务商的 ImageService（跳过 __init__ 的配置读取）"""
+    import threading
+    from collections import OrderedDict
+    from concurrent.futures import ThreadPoolExecutor
+
+    service = ImageService.__new__(ImageService)
+    service.provider_config = provider_config or {}
+    service._history_root = tmp_path
+    service._task_states = OrderedDict()
+    service._task_states_lock = threading.Lock()
+    service._executor = ThreadPoolExecutor(max_workers=4)
+    service._active_generations = 0
+    service._closed = False
+    service._executor_lock = threading.Lock()
+    service._make_task_prompt = lambda brand_style: None
+    return service
+
+
+def test_speculative_cover_reference_failure_does_not_fail_cover(tmp_path, monkeypatch, sample_pages):
+    """推测执行模式下封面参考图加载失败时，封面仍算成功，内容页不使用参考图"""
+    from backend.services import image as image_module
+
+    service = _make_service(tmp_path, {"high_concurrency": True, "speculative_content": True})
+    references = []
+
+    def fake_generate(page, task_id, reference_image, *args, **kwargs):
+        references.append(ImageService._resolve_reference(reference_image))
+        return page["index"], True, f"{page['index']}.png", None
+
+    def broken_cover(task_path, filename):
+        raise OSError("disk error")
+
+    service._generate_single_image = fake_generate
+    monkeypatch.setattr(ImageService, "_load_cover_reference", staticmethod(broken_cover))
+    monkeypatch.setattr(image_module, "_get_active_brand_style", lambda: None)
+
+    events = list(service.generate_images(sample_pages, task_id="task_spec"))
+
+    finish = events[-1]["data"]
+    assert finish["completed"] == len(sample_pages)
+    assert finish["failed"] == 0
+    assert not any(event["event"] == "error" for event in events)
+    assert all(reference is None for reference in references)
+    state = service.get_task_state("task_spec")
+    assert all(page.status == "done" for page in state["page_states"].values())
+
+
+@pytest.mark.parametrize("template", [
+    "页面：{page_content}\n大纲：{full_outline}",
+    "{page_content}",
+    "无占位符",
+    "转义 {{花括号}} 与 {page_content}",
+])
+def test_compile_template_matches_str_format(template):
+    fields = {"page_content": "内容", "full_outline": "大纲", "user_topic": "主题"}
+    assert _compile_template(template)(fields) == template.format(**fields)
+    assert _compile_template(template, "品牌风格\n")(fields) == "品牌风格\n" + template.format(**fields)
+
+
+def test_compile_template_falls_back_for_format_specs():
+    fields = {"page_content": "内容"}
+    for template in ["{page_content!r}", "{page_content:>6}"]:
+        assert _compile_template(template)(fields) == template.format(**fields)
+
+
+def test_compile_template_unbalanced_braces_raise_like_format():
+    with pytest.raises(ValueError):
+        _compile_template("缺少右括号 {page_content")({"page_content": "x"})
+
+
+def test_compile_template_missing_field_raises_key_error():
+    with pytest.raises(KeyError):
+        _compile_template("{unknown}")({"page_content": "x"})
+
+
+def test_task_states_evict_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(ImageService, "MAX_TASKS", 2)
+    service = _make_service(tmp_path)
+
+    service._put_state("a", {"id": "a"})
+    service._put_state("b", {"id": "b"})
+    assert service.get_task_state("a") == {"id": "a"}  # a 变为最近使用
+    service._put_state("c", {"id": "c"})
+
+    assert service.get_task_state("b") is None
+    assert service.get_task_state("a") == {"id": "a"}
+    assert service.get_task_state("c") == {"id": "c"}
+
+
+def test_thumbnail_lock_kept_while_waiters_hold_it(tmp_path, monkeypatch):
+    """第一个请求生成缩略图期间，等待同一把锁的请求不会因锁被移除而重复生成"""
+    import threading
+    import time
+    from backend.services import image as image_module
+
+    (tmp_path / "task_1").mkdir()
+    (tmp_path / "task_1" / "0.png").write_bytes(b"png")
+    monkeypatch.setattr(image_module, "_HISTORY_ROOT", tmp_path)
+
+    writing = threading.Event()
+    release = threading.Event()
+    writes = []
+
+    def slow_write(image_data, thumbnail_path):
+        writes.append(thumbnail_path)
+        writing.set()
+        release.wait(5)
+        with open(thumbnail_path, "wb") as f:
+            f.write(image_data)
+        return True
+
+    monkeypatch.setattr(image_module, "_write_thumbnail", slow_write)
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(image_module.get_thumbnail("task_1", "0.png")))
+    first.start()
+    assert writing.wait(5)
+
+    second = threading.Thread(target=lambda: results.append(image_module.get_thumbnail("task_1", "0.png")))
+    second.start()
+    thumbnail_path = str((tmp_path / "task_1" / "thumb_0.png").resolve())
+    deadline = time.monotonic() + 5
+    while image_module._thumbnail_locks.get(thumbnail_path, [None, 0])[1] < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert results == [thumbnail_path, thumbnail_path]
+    assert len(writes) == 1
+    assert thumbnail_path not in image_module._thumbnail_locks
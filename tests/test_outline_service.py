@@ -0,0 +1,68 @@
+"""
+OutlineService 回归测试
+"""
+import ast
+import inspect
+
+import pytest
+
+from backend.services import outline
+from backend.services.outline import OutlineService
+
+
+def _top_level_names(node_type):
+    tree = ast.parse(inspect.getsource(outline))
+    return [node.name for node in tree.body if isinstance(node, node_type)]
+
+
+def test_outline_service_defined_once():
+    """模块中只有一个 OutlineService 定义，不会被后面的重复定义覆盖"""
+    assert _top_level_names(ast.ClassDef).count("OutlineService") == 1
+    assert _top_level_names(ast.FunctionDef).count("get_outline_service") == 1
+
+
+def test_outline_service_supports_article_rewrite():
+    """改写模式的入口没有丢失"""
+    assert hasattr(OutlineService, "generate_outline")
+    assert hasattr(OutlineService, "generate_outline_from_article")
+
+
+def _parse(outline_text):
+    service = OutlineService.__new__(OutlineService)
+    return list(service._iter_outline(outline_text))
+
+
+def test_iter_outline_splits_pages_and_types():
+    pages = _parse("[封面]\n标题\n<page>\n[内容]\n正文\n<page>\n\n<page>[总结]\n结尾\n<page>[其他]\n未知类型")
+    assert [page["type"] for page in pages] == ["cover", "content", "summary", "content"]
+    # 空白页被跳过，但保留原始序号
+    assert [page["index"] for page in pages] == [0, 1, 3, 4]
+    assert pages[0]["content"] == "[封面]\n标题"
+
+
+def test_iter_outline_mixed_case_and_legacy_separator():
+    assert len(_parse("[封面]\na<PAGE>[内容]\nb<page>[总结]\nc")) == 3
+    assert [page["content"] for page in _parse("a\n---\nb")] == ["a", "b"]
+
+
+def test_iter_split_matches_str_split():
+    for text in ["", "a", "a---b", "---a---", "a------b"]:
+        assert list(outline._iter_split(text, "---")) == text.split("---")
+        assert list(outline._iter_regex_split(text, outline._PAGE_SPLIT_RE)) == outline._PAGE_SPLIT_RE.split(text)
+
+
+def test_decode_json_object_ignores_surrounding_text():
+    text = '```json\n{"outline": "大纲", "pages": [{"content": "a"}]}\n```'
+    data = outline._decode_json_object(text, text.find('{'))
+    assert data == {"outline": "大纲", "pages": [{"content": "a"}]}
+
+
+def test_decode_json_object_with_trailing_braces():
+    """JSON 之后还有花括号时回退到 raw_decode，只解析第一个对象"""
+    text = '{"outline": "x"} 备注: {不是 JSON}'
+    assert outline._decode_json_object(text, 0) == {"outline": "x"}
+
+
+def test_decode_json_object_invalid():
+    with pytest.raises(ValueError):
+        outline._decode_json_object('{"outline": ', 0)
@@ -0,0 +1,28 @@
+"""
+风格DNA提取服务测试
+"""
+from backend.services.style_extractor import StyleExtractorService, _SAMPLE_MAX_CHARS
+
+
+def test_build_content_samples_allows_null_text():
+    """正文为 null 的内容样本不应导致提取失败"""
+    samples = StyleExtractorService._build_content_samples(
+        [{"title": "标题1", "text": None}],
+        [{"title": "竞品1", "text": "竞品正文"}]
+    )
+    assert "【公司内容】\n标题: 标题1\n正文: " in samples
+    assert "【竞品参考】\n标题: 竞品1\n正文: 竞品正文" in samples
+
+
+def test_build_content_samples_truncates_and_dedupes():
+    long_text = "很" * (_SAMPLE_MAX_CHARS + 100)
+    samples = StyleExtractorService._build_content_samples(
+        [{"title": "原文", "text": long_text}],
+        [{"title": "转发", "text": long_text}]
+    )
+    assert samples.count("很") == _SAMPLE_MAX_CHARS
+    assert "转发" not in samples
+
+
+def test_build_content_samples_empty():
+    assert StyleExtractorService._build_content_samples([], []) is None
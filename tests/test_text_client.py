@@ -0,0 +1,109 @@
+"""
+文本客户端结果缓存测试（不发送网络请求）
+"""
+import pytest
+
+from backend.utils import text_client
+from backend.utils.text_client import TextChatClient, _ResponseCache
+
+
+@pytest.fixture
+def response_cache(monkeypatch):
+    """每个测试使用独立的内存缓存"""
+    cache = _ResponseCache()
+    monkeypatch.setattr(text_client, "_response_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def chat_client(monkeypatch, response_cache):
+    """_request_text 被替换为计数桩，返回值依次取自 client.replies"""
+    client = TextChatClient(api_key="sk-test-1234567890")
+    client.replies = ["第一次", "第二次", "第三次"]
+    client.calls = 0
+
+    def fake_request(payload, model):
+        reply = client.replies[client.calls]
+        client.calls += 1
+        return reply
+
+    monkeypatch.setattr(client, "_request_text", fake_request)
+    return client
+
+
+def test_make_key_depends_on_request_content():
+    base = dict(endpoint="e", model="m", temperature=0.5, max_output_tokens=10,
+                prompt="p", system_prompt=None, images=[b"img"])
+    key = _ResponseCache.make_key(**base)
+    assert key == _ResponseCache.make_key(**base)
+    assert key != _ResponseCache.make_key(**{**base, "prompt": "q"})
+    assert key != _ResponseCache.make_key(**{**base, "images": [b"other"]})
+    assert key != _ResponseCache.make_key(**base, response_format={"type": "json_object"})
+
+
+def test_ttl_expiry(monkeypatch, response_cache):
+    now = [1000.0]
+    monkeypatch.setattr(text_client.time, "time", lambda: now[0])
+
+    response_cache.put("k", "v")
+    now[0] += _ResponseCache.TTL_SECONDS - 1
+    assert response_cache.get("k") == "v"
+    now[0] += 1
+    assert response_cache.get("k") is None
+
+
+def test_lru_limit(monkeypatch, response_cache):
+    monkeypatch.setattr(_ResponseCache, "MAX_ENTRIES", 2)
+    response_cache.put("a", "1")
+    response_cache.put("b", "2")
+    assert response_cache.get("a") == "1"  # a 变为最近使用
+    response_cache.put("c", "3")
+    assert response_cache.get("b") is None
+    assert response_cache.get("a") == "1"
+    assert response_cache.get("c") == "3"
+
+
+def test_sqlite_backend_survives_new_instance(tmp_path):
+    db_path = str(tmp_path / "cache" / "responses.db")
+    _ResponseCache(db_path).put("k", "持久化结果")
+    assert _ResponseCache(db_path).get("k") == "持久化结果"
+
+
+def test_sqlite_backend_respects_ttl(monkeypatch, tmp_path):
+    db_path = str(tmp_path / "responses.db")
+    now = [1000.0]
+    monkeypatch.setattr(text_client.time, "time", lambda: now[0])
+    _ResponseCache(db_path).put("k", "v")
+    now[0] += _ResponseCache.TTL_SECONDS
+    assert _ResponseCache(db_path).get("k") is None
+
+
+def test_generate_text_does_not_cache_by_default(chat_client):
+    assert chat_client.generate_text("p", temperature=0.5) == "第一次"
+    assert chat_client.generate_text("p", temperature=0.5) == "第二次"
+
+
+def test_generate_text_caches_when_requested(chat_client):
+    assert chat_client.generate_text("p", temperature=0.5, cache=True) == "第一次"
+    assert chat_client.generate_text("p", temperature=0.5, cache=True) == "第一次"
+    assert chat_client.calls == 1
+
+
+def test_generate_text_skips_cache_above_temperature_threshold(chat_client):
+    temperature = _ResponseCache.MAX_TEMPERATURE + 0.1
+    assert chat_client.generate_text("p", temperature=temperature, cache=True) == "第一次"
+    assert chat_client.generate_text("p", temperature=temperature, cache=True) == "第二次"
+
+
+def test_generate_text_refresh_cache_bypasses_lookup(chat_client):
+    chat_client.generate_text("p", temperature=0.5, cache=True)
+    assert chat_client.generate_text("p", temperature=0.5, cache=True, refresh_cache=True) == "第二次"
+    # 重试得到的新结果会替换缓存
+    assert chat_client.generate_text("p", temperature=0.5, cache=True) == "第二次"
+    assert chat_client.calls == 2
+
+
+def test_generate_text_never_caches_empty_response(chat_client):
+    chat_client.replies = ["  ", "有效结果"]
+    assert chat_client.generate_text("p", temperature=0.5, cache=True) == "  "
+    assert chat_client.generate_text("p", temperature=0.5, cache=True) == "有效结果"